@@ -0,0 +1,119 @@
+"""Benchmark: threading engine vs asyncio engine.
+
+Measures new connections per second (one request per connection) and the
+resident memory / thread count each idle keep-alive connection costs.
+
+Run from roll-backend:  python -m bench.engines [idle_connections]
+"""
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+
+from server import vercel
+from server import verasync
+
+REQUEST = b'GET /ping HTTP/1.1\r\nHost: bench\r\n\r\n'
+CLOSE_REQUEST = b'GET /ping HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n'
+
+
+class PingHandler(vercel.API):
+    def vercel(self, url, data, headers):
+        self.send_code(200)
+        self.send_json({"code": 0, "msg": "pong"})
+
+
+def serve(engine, port):
+    if engine == "asyncio":
+        verasync.start(HandlerClass=PingHandler, port=port, bind="127.0.0.1")
+    else:
+        vercel.start(HandlerClass=PingHandler, port=port, bind="127.0.0.1")
+
+
+def proc_status(pid):
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            status[key] = value.split()[0] if value.split() else ""
+    return int(status["VmRSS"]), int(status["Threads"])
+
+
+def read_response(sock):
+    data = b""
+    while b"\r\n\r\n" not in data:
+        chunk = sock.recv(4096)
+        if not chunk:
+            return data
+        data += chunk
+    head, _, body = data.partition(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    while len(body) < length:
+        body += sock.recv(4096)
+    return head
+
+
+def connections_per_second(port, clients=8, duration=2.0):
+    count = [0] * clients
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        while time.perf_counter() < deadline:
+            with socket.create_connection(("127.0.0.1", port)) as sock:
+                sock.sendall(CLOSE_REQUEST)
+                read_response(sock)
+            count[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(count) / duration
+
+
+def idle_connections(pid, port, amount):
+    base_rss, base_threads = proc_status(pid)
+    socks = []
+    for _ in range(amount):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(REQUEST)
+        read_response(sock)
+        socks.append(sock)
+    time.sleep(0.5)
+    rss, threads = proc_status(pid)
+    for sock in socks:
+        sock.close()
+    return (rss - base_rss) / amount, threads - base_threads
+
+
+def run(engine, port, amount):
+    proc = multiprocessing.Process(target=serve, args=(engine, port), daemon=True)
+    proc.start()
+    for _ in range(50):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    try:
+        rate = connections_per_second(port)
+        per_conn, threads = idle_connections(proc.pid, port, amount)
+    finally:
+        proc.terminate()
+        proc.join()
+    print(f"{engine:8} | {rate:10.0f} conn/s | {per_conn:8.1f} KiB RSS per idle conn | +{threads} threads for {amount} conns")
+
+
+def main():
+    amount = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    run("thread", 15471, amount)
+    run("asyncio", 15472, amount)
+
+
+if __name__ == "__main__":
+    main()
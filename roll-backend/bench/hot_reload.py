@@ -0,0 +1,44 @@
+"""Benchmark: per-request cost of resolving a hot-reload handler.
+
+before : the module was re-executed on every request
+after  : one stat() per request, re-executed only when the file changes
+frozen : production mode, no filesystem access at all
+
+Run from roll-backend:  python -m bench.hot_reload [requests]
+"""
+import os
+import sys
+import time
+
+from server import vercel
+
+ROUTES = ["roll/random", "students/list_all", "user/login"]
+
+
+def timed(func, rounds):
+    begin = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - begin) / rounds * 1e6
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    root = os.getcwd()
+    for route in ROUTES:
+        name = os.path.join(root, route)
+        path = name + ".py"
+        before = timed(lambda: vercel.load_source(name, path), rounds)
+        vercel.load_handler(name, path)
+        after = timed(lambda: vercel.load_handler(name, path), rounds * 50)
+        print(f"{route:18} before {before:10.1f} us | after {after:7.2f} us")
+
+    vercel.freeze_handlers((os.path.join(root, r), os.path.join(root, r) + ".py") for r in ROUTES)
+    for route in ROUTES:
+        name = os.path.join(root, route)
+        frozen = timed(lambda: vercel.load_handler(name, name + ".py"), rounds * 50)
+        print(f"{route:18} frozen {frozen:7.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark: streaming MultipartReader vs the old byte-by-byte bytesplit parser.
+
+Run from roll-backend:  python -m bench.multipart [size_mb]
+"""
+import io
+import os
+import sys
+import time
+
+from server import vercel
+
+
+def legacy_parse(data):
+    """The parser DATA.parse_data used before MultipartReader (kept verbatim for comparison)."""
+    def bytesplit(data: bytes, sep: bytes):
+        start = 0
+        for cur in range(len(data) - len(sep) + 1):
+            if data[cur] == sep[0] and data[cur + 1] == sep[1] \
+            and data[cur:cur + len(sep)] == sep:
+                yield data[start:cur]
+                start = cur + len(sep)
+        yield data[start:]
+
+    def bytepack(data: bytearray):
+        result = {"Content-Disposition": "", "name": "", "filename": "", "Content-Type": "", "Content": None}
+        void_line = 0
+        data_start = 0
+        for item in bytesplit(data, b'\r\n'):
+            if void_line == 2:
+                result["Content"] = io.BytesIO(data[data_start:])
+                break
+            else:
+                data_start += len(item) + 2
+            if item.startswith(b'Content-Disposition:'):
+                attr = item.split(b';')
+                result["Content-Disposition"] = attr[0]
+                for i in range(1, len(attr)):
+                    attr[i] = attr[i].strip()
+                    if attr[i].startswith(b'name='):
+                        result["name"] = attr[i][6:-1]
+                    elif attr[i].startswith(b'filename='):
+                        result["filename"] = attr[i][10:-1].decode()
+            elif item.startswith(b'Content-Type:'):
+                result["Content-Type"] = item[14:]
+            elif item == b'':
+                void_line += 1
+        return result
+
+    boundary = ''
+    for item in bytesplit(data, b'\r\n'):
+        if item.startswith(b'--'):
+            boundary = item
+            break
+    result = []
+    for part in bytesplit(data, boundary):
+        if len(part) <= 2 or part.startswith(b'--'):
+            continue
+        result.append(bytepack(part))
+    return result
+
+
+def build_body(size, boundary):
+    payload = os.urandom(size)
+    body = (
+        b'--' + boundary + b'\r\n'
+        b'Content-Disposition: form-data; name="description"\r\n\r\n'
+        b'Software Engineering 2026\r\n'
+        b'--' + boundary + b'\r\n'
+        b'Content-Disposition: form-data; name="file"; filename="roster.xlsx"\r\n'
+        b'Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n\r\n'
+        + payload +
+        b'\r\n--' + boundary + b'--\r\n'
+    )
+    return body, payload
+
+
+def timed(func):
+    begin = time.perf_counter()
+    result = func()
+    return time.perf_counter() - begin, result
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    boundary = b'----WebKitFormBoundary7MA4YWxkTrZu0gW'
+    body, payload = build_body(int(size_mb * 1024 * 1024), boundary)
+
+    new_time, parts = timed(lambda: vercel.MultipartReader(io.BytesIO(body), len(body), boundary).parse())
+    assert parts[1]["Content"].read() == payload
+    print(f"body size        : {len(body) / 1024 / 1024:.2f} MiB")
+    print(f"MultipartReader  : {new_time * 1000:10.2f} ms")
+
+    old_time, old_parts = timed(lambda: legacy_parse(body))
+    # 旧实现会把结尾的 CRLF 当作内容，只比较有效负载
+    assert old_parts[1]["Content"].read().startswith(payload)
+    print(f"legacy bytesplit : {old_time * 1000:10.2f} ms")
+    print(f"speedup          : {old_time / new_time:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark: query plans and latency before / after the index migration.
+
+Builds a throwaway database with the pre-migration schema, prints the plan and
+average time of the hot queries, applies database/create.py's migrations and
+prints them again.
+
+Run from roll-backend:  python -m bench.query_plans [classes] [students_per_class]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+from database import table
+from database import create
+
+Student = table.Student
+ScoreModify = table.ScoreModify
+ClassCreater = table.ClassCreater
+
+QUERIES = {
+    "rank": lambda d: Student.select().where(Student.description == d)
+                             .order_by(Student.credits.desc()).limit(10),
+    "order pick": lambda d: Student.select().where(Student.description == d)
+                                   .order_by(Student.rolled, Student.id).limit(1),
+    "history": lambda d: ScoreModify.select().where(ScoreModify.description == d)
+                                    .order_by(ScoreModify.time.desc()).limit(50),
+    "classes of user": lambda d: ClassCreater.select().where(ClassCreater.creator == "user-" + d[-1]),
+}
+
+
+def populate(classes, per_class):
+    for model in (Student, ScoreModify, ClassCreater, table.ClassVersion):
+        model._schema.create_table()    # tables only, like a database created before the migration
+    rng = random.Random(0)
+    with table.db.atomic():
+        for c in range(classes):
+            desc = f"class-{c:04d}"
+            ClassCreater.insert(description=desc, creator=f"user-{c % 10}").execute()
+            Student.insert_many([
+                dict(id=f"{s:05d}", name=f"n{s}", major="m", description=desc,
+                     credits=rng.randint(-5, 50), rolled=rng.randint(0, 20))
+                for s in range(per_class)
+            ]).execute()
+            ScoreModify.insert_many([
+                dict(id=f"{rng.randrange(per_class):05d}", description=desc,
+                     time=f"2025-01-01 00:00:{i:06d}", modify=1, is_attend=True,
+                     is_repeat=False, answer_condition=1)
+                for i in range(per_class * 5)
+            ]).execute()
+
+
+def report(label, classes, rounds=200):
+    print(f"--- {label} (schema version {table.db.user_version})")
+    for name, build in QUERIES.items():
+        sql, params = build("class-0000").sql()
+        plan = table.db.execute_sql("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        begin = time.perf_counter()
+        for i in range(rounds):
+            list(build(f"class-{i % classes:04d}").tuples())
+        spent = (time.perf_counter() - begin) / rounds * 1e6
+        print(f"{name:16} {spent:10.1f} us | " + "; ".join(row[-1] for row in plan))
+
+
+def main():
+    classes = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    per_class = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        table.db.init(os.path.join(tmp, "bench.db"), timeout=10)
+        table.db.connect()
+        populate(classes, per_class)
+        report("before", classes)
+        create.migrate()
+        report("after", classes)
+        table.db.close()
+
+
+if __name__ == "__main__":
+    main()
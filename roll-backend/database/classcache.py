@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+# classes kept in memory per cache and process; the least recently used ones are dropped first
+MAX_CLASSES = 256
+
+
+class ClassEntry:
+    """Cached value of one class together with the class data version it was built from.
+
+    Readers and in-place updates of value hold lock.
+    """
+    def __init__(self, version, value):
+        self.version = version
+        self.value = value
+        self.lock = threading.Lock()
+
+
+class ClassCache:
+    """Per-process LRU of per-class structures (roll sampler, leaderboard) tied to ClassVersion.
+
+    get() builds the value lazily and rebuilds it whenever the class version moved; changed()
+    lets the writer of a commit update the value in place instead. Any write the cache did not
+    see (an import, a delete, another worker process) leaves it a version behind, so the entry
+    is dropped and rebuilt on the next read.
+    """
+    def __init__(self, build, max_classes=MAX_CLASSES):
+        self.build = build          # description -> value; the caller holds a database connection
+        self.max_classes = max_classes
+        self._entries = OrderedDict()   # description -> ClassEntry
+        self._lock = threading.Lock()
+
+    def get(self, description, version):
+        """Entry for the class at the given data version."""
+        with self._lock:
+            entry = self._entries.get(description)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(description)
+                return entry
+        entry = ClassEntry(version, self.build(description))
+        with self._lock:
+            self._entries[description] = entry
+            self._entries.move_to_end(description)
+            while len(self._entries) > self.max_classes:
+                self._entries.popitem(last=False)
+        return entry
+
+    def changed(self, description, version, apply):
+        """Run apply(value) after a commit that moved the class from version - 1 to version.
+
+        apply returns False when it cannot update the value in place (e.g. an unknown student),
+        and must check that before changing anything; the entry is then dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(description)
+            if entry is None:
+                return
+        with entry.lock:
+            if entry.version == version - 1 and apply(entry.value):
+                entry.version = version
+                return
+        with self._lock:
+            if self._entries.get(description) is entry:
+                del self._entries[description]
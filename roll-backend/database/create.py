@@ -1,5 +1,71 @@
 import os
-import table
+
+try:
+    from database import table
+except ImportError:
+    # run as a script: python3 database/create.py
+    import table
+
+
+def add_indexes(db):
+    """Covering indexes for ranking, order-mode picking, score history and per-user class lookups."""
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "student_description_credits" '
+                   'ON "student" ("description", "credits")')
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "student_description_rolled_id" '
+                   'ON "student" ("description", "rolled", "id")')
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "scoremodify_description_time" '
+                   'ON "scoremodify" ("description", "time")')
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "classcreater_creator" '
+                   'ON "classcreater" ("creator")')
+
+
+def add_score_rollups(db):
+    """Per-student and per-day ScoreModify rollups, filled from the existing log."""
+    db.create_tables([table.ScoreStudentStat, table.ScoreDailyStat], safe=True)
+    db.execute_sql('DELETE FROM "scorestudentstat"')
+    db.execute_sql('DELETE FROM "scoredailystat"')
+    db.execute_sql('INSERT INTO "scorestudentstat" ("description", "id", "rolls", "attended", "repeated", '
+                   '"answer_total", "score_total", "last_time") '
+                   'SELECT "description", "id", COUNT(*), SUM("is_attend"), SUM("is_repeat"), '
+                   'SUM("answer_condition"), SUM("modify"), MAX("time") '
+                   'FROM "scoremodify" GROUP BY "description", "id"')
+    db.execute_sql('INSERT INTO "scoredailystat" ("description", "day", "id", "rolls", "attended", "repeated", '
+                   '"answer_total", "score_total") '
+                   'SELECT "description", substr("time", 1, 10), "id", COUNT(*), SUM("is_attend"), '
+                   'SUM("is_repeat"), SUM("answer_condition"), SUM("modify") '
+                   'FROM "scoremodify" GROUP BY "description", substr("time", 1, 10), "id"')
+
+
+# (schema version, migration). The database records the last applied version in PRAGMA user_version;
+# append new migrations at the end and never edit one that has been released.
+MIGRATIONS = [
+    (1, add_indexes),
+    (2, add_score_rollups),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate():
+    """Apply every migration newer than the database's schema version.
+
+    Each migration runs in its own transaction together with the version bump, so an interrupted
+    run resumes where it stopped. With WAL the running server keeps reading while an index is built;
+    its writers wait on the busy timeout.
+    """
+    current = table.db.user_version
+    applied = []
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        with table.db.atomic():
+            migration(table.db)
+            table.db.user_version = version
+        applied.append(version)
+        print(f"Applied migration {version}: {migration.__name__}")
+    if applied:
+        # refresh planner statistics for the new indexes
+        table.db.execute_sql("PRAGMA optimize")
+    return applied
 
 
 def ensure_db_and_table():
@@ -9,17 +75,25 @@ def ensure_db_and_table():
     # connect (this will create the sqlite file on disk when tables are created)
     table.db.connect(reuse_if_open=True)
 
+    tables = [table.Student, table.ClassCreater, table.ScoreModify, table.ClassVersion,
+              table.ScoreStudentStat, table.ScoreDailyStat]
     if need_create_file:
         # Create tables which will also create the sqlite file
-        table.db.create_tables([table.Student, table.ClassCreater, table.ScoreModify])
-        print(f"Created database file '{table.DB_PATH}' and 'student' table.")
+        table.db.create_tables(tables)
+        print(f"Created database file '{table.DB_PATH}' and tables.")
     else:
-        # If file exists, ensure table exists; create if missing
-        if not table.db.table_exists(table.Student._meta.table_name):
-            table.db.create_tables([table.Student])
-            print(f"Database file exists; created missing 'student' table in '{table.DB_PATH}'.")
+        # If file exists, create whichever tables are missing
+        missing = [t for t in tables if not table.db.table_exists(t._meta.table_name)]
+        if missing:
+            table.db.create_tables(missing)
+            names = ", ".join(t._meta.table_name for t in missing)
+            print(f"Database file exists; created missing tables {names} in '{table.DB_PATH}'.")
         else:
-            print(f"Database file '{table.DB_PATH}' and table 'student' already exist.")
+            print(f"Database file '{table.DB_PATH}' and all tables already exist.")
+
+    # Bring older database files up to the current schema (safe to run while the server is up)
+    migrate()
+    print(f"Schema version {table.db.user_version}.")
 
     table.db.close()
 
@@ -0,0 +1,90 @@
+from bisect import bisect_left, insort
+
+from database import table
+from database.classcache import ClassCache
+
+Student = table.Student
+
+
+class Leaderboard:
+    """Students of one class ordered by (credits, id).
+
+    keys is a sorted list, so locating a student or a page is a binary search and reading
+    k entries is a slice: O(log n + k). Moving a student after a credits change shifts
+    part of the list (a memmove), which stays well below a query for class sizes we see.
+    """
+    def __init__(self, rows):
+        self.students = {}      # id -> [name, credits, rolled]
+        for sid, name, credits, rolled in rows:
+            self.students[sid] = [name, credits, rolled]
+        self.keys = sorted((s[1], sid) for sid, s in self.students.items())
+
+    def __len__(self):
+        return len(self.keys)
+
+    def update(self, sid, credits, rolled):
+        """New credits / rolled of a student already on the board."""
+        student = self.students[sid]
+        if student[1] != credits:
+            del self.keys[bisect_left(self.keys, (student[1], sid))]
+            insort(self.keys, (credits, sid))
+            student[1] = credits
+        student[2] = rolled
+
+    def entry(self, sid):
+        name, credits, rolled = self.students[sid]
+        return {
+            "student_id": sid,
+            "student_name": name,
+            "credits": credits,
+            "random_rolls": rolled,
+        }
+
+    def page(self, descending=False, offset=0, limit=-1):
+        """Entries ranked from the bottom (ascending) or the top (descending); limit -1 means all."""
+        n = len(self.keys)
+        stop = n if limit == -1 else min(n, offset + limit)
+        if offset >= stop:
+            return []
+        if descending:
+            keys = self.keys[n - stop:n - offset][::-1]
+        else:
+            keys = self.keys[offset:stop]
+        return [self.entry(sid) for _, sid in keys]
+
+    def rank(self, sid, descending=False):
+        """1-based competition rank: one plus the number of students with strictly better credits."""
+        credits = self.students[sid][1]
+        if descending:
+            return len(self.keys) - bisect_left(self.keys, (credits + 1,)) + 1
+        return bisect_left(self.keys, (credits,)) + 1
+
+
+def build(description):
+    """Warm the board with one narrow query; the caller holds a database connection."""
+    return Leaderboard(Student
+                       .select(Student.id, Student.name, Student.credits, Student.rolled)
+                       .where(Student.description == description)
+                       .tuples())
+
+
+_classes = ClassCache(build)
+
+
+def get(description, version):
+    """ClassEntry whose value is the Leaderboard of the class at the given data version."""
+    return _classes.get(description, version)
+
+
+def students_changed(description, version, changes):
+    """Apply an iterable of (sid, credits, rolled) after a commit that moved the class from version - 1 to version."""
+    changes = list(changes)
+
+    def apply(board):
+        if any(sid not in board.students for sid, _, _ in changes):
+            return False
+        for sid, credits, rolled in changes:
+            board.update(sid, credits, rolled)
+        return True
+
+    _classes.changed(description, version, apply)
@@ -0,0 +1,149 @@
+import random
+
+from database import table
+from database.classcache import ClassCache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Student = table.Student
+
+
+def weight(credits):
+    """Students with more credits are drawn less often: 1 / (credits + 1), negative credits count as 0."""
+    try:
+        c = int(credits)
+    except (TypeError, ValueError):
+        c = 0
+    return 1.0 / (max(c, 0) + 1)
+
+
+class FenwickSampler:
+    """Weighted random choice over students with O(log n) draws and weight updates.
+
+    tree is a Fenwick (binary indexed) tree of the weights, 1-based.
+    """
+    def __init__(self, ids, names, weights):
+        self.ids = list(ids)
+        self.names = list(names)
+        self.weights = list(weights)
+        self.index = {sid: i for i, sid in enumerate(self.ids)}
+        self.rebuild()
+
+    def rebuild(self):
+        """Recompute the tree in O(n); also clears floating point drift from many updates."""
+        n = len(self.weights)
+        tree = [0.0] * (n + 1)
+        for i, w in enumerate(self.weights, 1):
+            tree[i] += w
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.total = sum(self.weights)
+        self.updates = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def update(self, sid, w):
+        """Set the weight of a student."""
+        self.set(self.index[sid], w)
+
+    def set(self, i, w):
+        """Set the weight at 0-based position i."""
+        delta = w - self.weights[i]
+        self.weights[i] = w
+        self.total += delta
+        self.updates += 1
+        if self.updates > max(1024, len(self.tree)):
+            self.rebuild()
+            return
+        i += 1
+        n = len(self.tree) - 1
+        while i <= n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target):
+        """0-based index of the first student whose prefix sum of weights exceeds target."""
+        n = len(self.tree) - 1
+        pos = 0
+        step = 1 << (n.bit_length() - 1) if n else 0
+        while step:
+            nxt = pos + step
+            if nxt <= n and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return min(pos, n - 1)
+
+    def draw(self, rng=random):
+        """Pick one student, returns (id, name)."""
+        i = self.find(rng.random() * self.total)
+        return self.ids[i], self.names[i]
+
+    def sample(self, k, rng=random):
+        """Pick k distinct students, returns [(id, name)] in draw order.
+
+        Each draw is weighted among the students not picked yet (successive sampling without
+        replacement). Small k walks the tree k times with the picked weights set to 0 and then
+        restored, O(k log n); when k is a large part of the class and NumPy is installed, one
+        vectorized Efraimidis-Spirakis pass over all weights is cheaper.
+        """
+        k = min(k, len(self.ids))
+        if np is not None and k * 8 > len(self.ids):
+            weights = np.fromiter(self.weights, dtype=float, count=len(self.weights))
+            keys = np.log(np.random.default_rng(rng.getrandbits(64)).random(len(weights))) / weights
+            top = np.argpartition(-keys, k - 1)[:k]
+            picked = top[np.argsort(-keys[top])].tolist()
+        else:
+            picked = []
+            saved = []
+            try:
+                while len(picked) < k:
+                    i = self.find(rng.random() * self.total)
+                    if self.weights[i] == 0.0:
+                        # accumulated rounding put the target on an already picked student
+                        self.rebuild()
+                        continue
+                    picked.append(i)
+                    saved.append((i, self.weights[i]))
+                    self.set(i, 0.0)
+            finally:
+                for i, w in saved:
+                    self.set(i, w)
+        return [(self.ids[i], self.names[i]) for i in picked]
+
+
+def build(description):
+    """Load the class once with a narrow query; the caller holds a database connection."""
+    rows = list(Student
+                .select(Student.id, Student.name, Student.credits)
+                .where(Student.description == description)
+                .tuples())
+    return FenwickSampler((r[0] for r in rows), (r[1] for r in rows), (weight(r[2]) for r in rows))
+
+
+_classes = ClassCache(build)
+
+
+def get(description, version):
+    """ClassEntry whose value is the FenwickSampler of the class at the given data version."""
+    return _classes.get(description, version)
+
+
+def credits_changed(description, version, changes):
+    """Apply new credits, an iterable of (sid, credits), after a commit that moved the class from version - 1 to version."""
+    changes = list(changes)
+
+    def apply(sampler):
+        if any(sid not in sampler.index for sid, _ in changes):
+            return False
+        for sid, credits in changes:
+            sampler.update(sid, weight(credits))
+        return True
+
+    _classes.changed(description, version, apply)
@@ -1,12 +1,48 @@
 import os
-from peewee import SqliteDatabase, Model, CharField, IntegerField, BooleanField, CompositeKey
+import hashlib
+from contextlib import contextmanager
+from peewee import SqliteDatabase, Model, CharField, IntegerField, BooleanField, CompositeKey, chunked
 
 
 # Database file placed in the same folder as this script
 BASE_DIR = os.path.abspath(os.getcwd())
 DB_PATH = os.path.join(BASE_DIR, "database.db")
 
-db = SqliteDatabase(DB_PATH)
+# Rows per INSERT of a bulk import; 4 bound parameters each stays below SQLite's old 999-variable limit
+IMPORT_CHUNK = 200
+
+# SQLite page cache per connection, in KiB (override with ROLL_DB_CACHE_KIB)
+CACHE_SIZE_KIB = int(os.environ.get("ROLL_DB_CACHE_KIB", 16 * 1024))
+MMAP_SIZE = 256 * 1024 * 1024
+
+# 多个工作进程可能同时访问数据库文件，遇到锁时最多等待 10 秒而不是立即报错。
+# 以下 PRAGMA 在每个连接打开时执行一次：WAL 让读不阻塞写，NORMAL 在 WAL 下只在检查点时 fsync。
+db = SqliteDatabase(DB_PATH, timeout=10, pragmas={
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": MMAP_SIZE,
+    "cache_size": -CACHE_SIZE_KIB,
+})
+
+
+@contextmanager
+def connection():
+    """Borrow the current thread's connection.
+
+    The connection is opened on first use and then kept for the life of the thread
+    (peewee stores it thread-locally), so handlers never reopen the file or re-read the schema.
+    """
+    db.connect(reuse_if_open=True)
+    yield db
+
+
+def _reset_after_fork():
+    """A SQLite connection must not be used across fork(); drop the inherited one in the child."""
+    db._state.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 class BaseModel(Model):
@@ -23,6 +59,10 @@ class Student(BaseModel):
     rolled = IntegerField(default = 0)   # default to 0  随机到几次
     class Meta:
         primary_key = CompositeKey('id', 'description')
+        indexes = (
+            (('description', 'credits'), False),        # 班级内按积分排行
+            (('description', 'rolled', 'id'), False),   # 顺序点名：被点次数最少者
+        )
 
 
 class ScoreModify(BaseModel):
@@ -35,8 +75,105 @@ class ScoreModify(BaseModel):
     answer_condition = IntegerField()  # non-null 回答问题情况评分
     class Meta:
         primary_key = CompositeKey('id', 'description', 'time')
+        indexes = (
+            (('description', 'time'), False),           # 班级积分历史按时间扫描
+        )
+
+
+class ScoreStudentStat(BaseModel):
+    """ScoreModify rolled up per student; maintained in the same transaction as every roll/result."""
+    description = CharField()   # 班级描述
+    id = CharField()            # 学号
+    rolls = IntegerField(default=0)         # 记录条数
+    attended = IntegerField(default=0)      # 出勤次数
+    repeated = IntegerField(default=0)      # 能复述问题的次数
+    answer_total = IntegerField(default=0)  # 回答问题评分之和
+    score_total = IntegerField(default=0)   # 加减分之和
+    last_time = CharField(null=True)        # 最近一条记录的时间
+    class Meta:
+        primary_key = CompositeKey('description', 'id')
+
+
+class ScoreDailyStat(BaseModel):
+    """ScoreModify rolled up per student and day; time-range queries scan (description, day)."""
+    description = CharField()   # 班级描述
+    day = CharField()           # 日期，格式YYYY-MM-DD
+    id = CharField()            # 学号
+    rolls = IntegerField(default=0)
+    attended = IntegerField(default=0)
+    repeated = IntegerField(default=0)
+    answer_total = IntegerField(default=0)
+    score_total = IntegerField(default=0)
+    class Meta:
+        primary_key = CompositeKey('description', 'day', 'id')
 
 
 class ClassCreater(BaseModel):
     description = CharField(primary_key=True)  # 班级描述，实际上就是班级名称
-    creator = CharField()  # non-null 创建者姓名，有可能是token
\ No newline at end of file
+    creator = CharField(index=True)  # non-null 创建者姓名，有可能是token；按用户列出/删除班级时使用
+
+
+class ClassVersion(BaseModel):
+    description = CharField(primary_key=True)  # 班级描述，实际上就是班级名称
+    version = IntegerField(default=0)          # 数据版本，学生或积分每次变化都加一；删除班级时保留该行
+
+
+def bump_version(*descriptions):
+    """Increase the data version of the given classes.
+
+    Call it inside the writer's transaction so readers never see new data with an old version.
+    """
+    for description in descriptions:
+        (ClassVersion
+         .insert(description=description, version=1)
+         .on_conflict(conflict_target=[ClassVersion.description],
+                      update={ClassVersion.version: ClassVersion.version + 1})
+         .execute())
+
+
+def get_version(description):
+    """Current data version of a class, 0 if it was never written."""
+    row = (ClassVersion
+           .select(ClassVersion.version)
+           .where(ClassVersion.description == description)
+           .tuples()
+           .first())
+    return row[0] if row else 0
+
+
+def _upsert_students_sql(count):
+    """INSERT ... ON CONFLICT(id, description) DO UPDATE for count rows of (id, name, major, description)."""
+    values = ", ".join(["(?, ?, ?, ?, 0, 0)"] * count)
+    return ('INSERT INTO "student" ("id", "name", "major", "description", "credits", "rolled") '
+            f'VALUES {values} ON CONFLICT ("id", "description") '
+            'DO UPDATE SET "name" = excluded."name", "major" = excluded."major"')
+
+
+def upsert_students(description, rows):
+    """Insert or update (student_id, name, major) rows of one class, returns (inserted, updated).
+
+    Run it inside a transaction so the row counts before and after belong to this import only.
+    A student id repeated in rows counts as an update the second time, as with row-by-row saves.
+    """
+    in_class = Student.select().where(Student.description == description)
+    before = in_class.count()
+    total = 0
+    full_chunk = _upsert_students_sql(IMPORT_CHUNK)
+    for chunk in chunked(rows, IMPORT_CHUNK):
+        params = []
+        for sid, name, major in chunk:
+            params += (sid, name, major, description)
+        sql = full_chunk if len(chunk) == IMPORT_CHUNK else _upsert_students_sql(len(chunk))
+        db.execute_sql(sql, params)
+        total += len(chunk)
+    inserted = in_class.count() - before
+    return inserted, total - inserted
+
+
+def make_etag(*parts):
+    """Weak ETag for a representation identified by parts (endpoint, parameters, versions...).
+
+    The gzip, br and identity bodies of one representation share the tag, so it must not
+    claim byte equality; If-None-Match revalidation uses weak comparison anyway.
+    """
+    return 'W/"%s"' % hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=12).hexdigest()
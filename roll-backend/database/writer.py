@@ -0,0 +1,120 @@
+import os
+import logging
+import threading
+from queue import Queue, Full, Empty
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from server import vercel
+from database import table
+
+db = table.db
+
+QUEUE_SIZE = 1024       # writes waiting per process; submit() blocks while the queue is full
+MAX_BATCH = 128         # writes committed together in one transaction
+SUBMIT_TIMEOUT = 10     # seconds to wait for room in the queue
+RESULT_TIMEOUT = 30     # seconds call() waits for a write to start before withdrawing it
+
+
+class Writer:
+    """Runs every mutation of this process on one thread with group commit.
+
+    Handlers submit a function; the writer takes whatever is waiting in the queue (up to
+    max_batch) and runs it inside one BEGIN IMMEDIATE ... COMMIT, each function in its own
+    savepoint so a failing one only rolls back itself. Callers get the function's return value
+    (or exception) through a Future once the shared transaction has committed. Readers keep
+    using their own per-thread connections and are never blocked by the queue.
+    """
+    def __init__(self, capacity=QUEUE_SIZE, max_batch=MAX_BATCH):
+        self.capacity = capacity
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Fresh queue and thread, also used in a forked child where the parent's thread does not exist."""
+        self.queue = Queue(self.capacity)
+        self.thread = vercel.daemon(self.run)
+        self.commits = 0
+        self.writes = 0
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) for the writer thread, returns a Future."""
+        with self.lock:
+            if self.thread.thread is None or not self.thread.thread.is_alive():
+                self.thread()
+        future = Future()
+        try:
+            self.queue.put((func, args, kwargs, future), timeout=SUBMIT_TIMEOUT)
+        except Full:
+            raise RuntimeError("Database write queue is full, try again later.")
+        return future
+
+    def call(self, func, *args, **kwargs):
+        """Run func on the writer thread and wait for its committed result.
+
+        A write still queued after RESULT_TIMEOUT is cancelled, so the writer skips it and the
+        caller's error is true. Once it has started it is waited for: its batch either commits
+        or fails as a whole, and reporting failure for a committed write would invite a retry
+        that applies it twice.
+        """
+        future = self.submit(func, *args, **kwargs)
+        try:
+            return future.result(RESULT_TIMEOUT)
+        except FutureTimeout:
+            if future.cancel():
+                raise RuntimeError("Database write was not started in time and has been dropped, try again later.")
+            return future.result()
+
+    def run(self):
+        with table.connection():
+            while True:
+                batch = [self.queue.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except Empty:
+                        break
+                self.commit(batch)
+
+    def commit(self, batch):
+        """One transaction for the whole batch; results are released only after COMMIT.
+
+        If BEGIN IMMEDIATE or COMMIT fails (e.g. "database is locked" while another worker
+        process writes) the whole transaction is rolled back, so every write of the batch that
+        has not failed on its own fails with that error, including the ones that never ran.
+        """
+        done = []
+        try:
+            with db.atomic(lock_type="IMMEDIATE"):
+                for func, args, kwargs, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with db.atomic():
+                            result = func(*args, **kwargs)
+                    except Exception as e:
+                        future.set_exception(e)
+                    else:
+                        done.append((future, result))
+        except Exception as e:
+            vercel.verlog.name("writer")(f"Group commit of {len(batch)} writes failed: {e}", level=logging.ERROR)
+            if db.connection().in_transaction:
+                # peewee rolls back a failed COMMIT; make sure nothing is left open for the next batch
+                db.connection().rollback()
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.commits += 1
+        self.writes += len(done)
+        for future, result in done:
+            future.set_result(result)
+
+
+writer = Writer()
+submit = writer.submit
+call = writer.call
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=writer.reset)
@@ -0,0 +1,135 @@
+import datetime
+
+from peewee import fn, JOIN
+
+from server import vercel
+from server import decorators as dec
+from database import table
+
+db = table.db
+Student = table.Student
+StudentStat = table.ScoreStudentStat
+DailyStat = table.ScoreDailyStat
+
+
+def parse_day(value):
+    """YYYY-MM-DD or None; raises ValueError for anything else."""
+    if value in (None, ""):
+        return None
+    return datetime.date.fromisoformat(str(value)).isoformat()
+
+
+def totals(rolls, attended, repeated, answer_total, score_total):
+    rolls = rolls or 0
+    return {
+        "rolls": rolls,
+        "attended": attended or 0,
+        "repeated": repeated or 0,
+        "attendance_rate": round((attended or 0) / rolls, 4) if rolls else None,
+        "avg_answer": round((answer_total or 0) / rolls, 4) if rolls else None,
+        "score": score_total or 0,
+    }
+
+
+@dec.hot_reload
+@vercel.register
+def main(response, data):
+    """Score history of a class from the rollup tables, optionally for one student and a day range.
+
+    Without a range the per-student totals come straight from ScoreStudentStat; with one, only the
+    (description, day) slice of ScoreDailyStat is read, so the cost follows days x students and not
+    the length of the ScoreModify log.
+    """
+    # 输入校验：兼容 querystring（字符串）以及 body（字典）
+    if not isinstance(data, dict):
+        response.send_code(200)
+        response.send_json({"code": 400, "msg": "Input data must be a dictionary.", "data": {}})
+        return
+
+    description = data.get("description")
+    if not description:
+        response.send_code(200)
+        response.send_json({"code": 400, "msg": "Input data must contain 'description' field.", "data": {}})
+        return
+
+    # 解析时间范围（包含首尾两天）
+    try:
+        start = parse_day(data.get("start"))
+        end = parse_day(data.get("end"))
+    except ValueError:
+        response.send_code(200)
+        response.send_json({"code": 400, "msg": "start and end must be dates in YYYY-MM-DD format.", "data": {}})
+        return
+    if start and end and start > end:
+        response.send_code(200)
+        response.send_json({"code": 400, "msg": "start must not be later than end.", "data": {}})
+        return
+
+    student_id = data.get("student_id")
+    student_id = str(student_id) if student_id not in (None, "") else None
+
+    with table.connection():
+        # 积分每次变化都会提升班级版本号，汇总表与之在同一事务中更新
+        etag = table.make_etag("history", description, table.get_version(description), start, end, student_id)
+        if response.not_modified(etag):
+            return
+
+        where = DailyStat.description == description
+        if start:
+            where &= DailyStat.day >= start
+        if end:
+            where &= DailyStat.day <= end
+        if student_id is not None:
+            where &= DailyStat.id == student_id
+
+        day_rows = list(DailyStat
+                        .select(DailyStat.day, fn.SUM(DailyStat.rolls), fn.SUM(DailyStat.attended),
+                                fn.SUM(DailyStat.repeated), fn.SUM(DailyStat.answer_total),
+                                fn.SUM(DailyStat.score_total))
+                        .where(where)
+                        .group_by(DailyStat.day)
+                        .order_by(DailyStat.day)
+                        .tuples())
+
+        if start or end:
+            # 指定范围时按天汇总表求和
+            stats = (DailyStat
+                     .select(DailyStat.id, Student.name, fn.SUM(DailyStat.rolls), fn.SUM(DailyStat.attended),
+                             fn.SUM(DailyStat.repeated), fn.SUM(DailyStat.answer_total),
+                             fn.SUM(DailyStat.score_total))
+                     .join(Student, on=((Student.id == DailyStat.id) & (Student.description == DailyStat.description)),
+                           join_type=JOIN.LEFT_OUTER)
+                     .where(where)
+                     .group_by(DailyStat.id)
+                     .order_by(DailyStat.id))
+        else:
+            student_where = StudentStat.description == description
+            if student_id is not None:
+                student_where &= StudentStat.id == student_id
+            stats = (StudentStat
+                     .select(StudentStat.id, Student.name, StudentStat.rolls, StudentStat.attended,
+                             StudentStat.repeated, StudentStat.answer_total, StudentStat.score_total)
+                     .join(Student, on=((Student.id == StudentStat.id) & (Student.description == StudentStat.description)),
+                           join_type=JOIN.LEFT_OUTER)
+                     .where(student_where)
+                     .order_by(StudentStat.id))
+        students = [dict(student_id=sid, student_name=name, **totals(*counts))
+                    for sid, name, *counts in stats.tuples()]
+
+    days = [dict(day=day, **totals(*counts)) for day, *counts in day_rows]
+    summary = totals(*(sum(column) for column in zip(*(counts for _, *counts in day_rows)))) \
+        if day_rows else totals(0, 0, 0, 0, 0)
+    response.send_code(200)
+    response.send_etag(etag)
+    response.send_json({
+        "code": 0,
+        "msg": "Success" if days else f"No score history found for class '{description}'.",
+        "data": {
+            "description": description,
+            "start": start,
+            "end": end,
+            "summary": summary,
+            "days": days,
+            "students": students,
+        }
+    })
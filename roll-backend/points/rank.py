@@ -1,6 +1,7 @@
 from server import vercel
 from server import decorators as dec
 from database import table
+from database import leaderboard
 
 db = table.db
 Student = table.Student
@@ -44,31 +45,49 @@ def main(response, data):
         response.send_json({"code": 400, "msg": "Amount must be -1 (all) or a positive integer.", "data": []})
         return
 
+    # 解析 offset（分页起点，从 0 开始）
+    try:
+        offset = int(data.get("offset", 0))
+    except Exception:
+        offset = -1
+    if offset < 0:
+        response.send_code(200)
+        response.send_json({"code": 400, "msg": "Offset must be a non-negative integer.", "data": []})
+        return
+
+    # 可选 student_id：同时返回该学生在当前排序下的名次
+    student_id = data.get("student_id")
+    student_id = str(student_id) if student_id not in (None, "") else None
+
     class_desc = description
 
-    db.connect(reuse_if_open=True)
-    students_query = Student.select().where(Student.description == class_desc)
-    # 先按分数排序，再限制条数（保持语义）
-    if order == 0:
-        students_query = students_query.order_by(Student.credits.asc())
-    else:
-        students_query = students_query.order_by(Student.credits.desc())
-    if amount != -1:
-        students_query = students_query.limit(amount)
+    with table.connection():
+        # 班级数据没有变化时直接回复 304，不再查询和序列化
+        version = table.get_version(class_desc)
+        etag = table.make_etag("rank", class_desc, version, order, amount, offset, student_id)
+        if response.not_modified(etag):
+            return
+        # 排行榜常驻内存，按版本号失效；点名结果直接更新其中的积分
+        entry = leaderboard.get(class_desc, version)
 
-    result = []
-    for student in students_query:
-        result.append({
-            "student_id": student.id,
-            "student_name": student.name,
-            "credits": student.credits,
-            "random_rolls": student.rolled,
-        })
+    with entry.lock:
+        board = entry.value
+        result = board.page(descending=order == 1, offset=offset, limit=amount)
+        total = len(board)
+        student = None
+        if student_id is not None and student_id in board.students:
+            student = board.entry(student_id)
+            student["rank"] = board.rank(student_id, descending=order == 1)
 
-    db.close()
-    response.send_code(200)
-    response.send_json({
+    body = {
         "code": 0,
-        "msg": "Success" if result else f"No students found for class '{class_desc}'.",
-        "data": result
-    })
\ No newline at end of file
+        # offset 超出末尾时返回空页和 total，与空班级（total 为 0）区分开
+        "msg": "Success" if total else f"No students found for class '{class_desc}'.",
+        "data": result,
+        "total": total,
+    }
+    if student_id is not None:
+        body["student"] = student
+    response.send_code(200)
+    response.send_etag(etag)
+    response.send_json(body)
\ No newline at end of file
@@ -0,0 +1,126 @@
+import datetime
+
+from database import table
+from database import sampler
+from database import leaderboard
+from database import writer
+
+db = table.db
+Student = table.Student
+
+# credits is an integer column: adding a fractional score truncates toward zero, as IntegerField did on save()
+UPDATE_STUDENT = ('UPDATE "student" SET "credits" = CAST("credits" + ? AS INTEGER), "rolled" = "rolled" + 1 '
+                  'WHERE "id" = ? AND "description" = ?')
+INSERT_MODIFY = ('INSERT INTO "scoremodify" ("id", "description", "time", "modify", '
+                 '"is_attend", "is_repeat", "answer_condition") VALUES (?, ?, ?, ?, ?, ?, ?)')
+# rollups of the audit log, written together with INSERT_MODIFY
+_ROLLUP_ADD = ('"rolls" = "rolls" + 1, "attended" = "attended" + excluded."attended", '
+               '"repeated" = "repeated" + excluded."repeated", '
+               '"answer_total" = "answer_total" + excluded."answer_total", '
+               '"score_total" = "score_total" + excluded."score_total"')
+UPSERT_STUDENT_STAT = ('INSERT INTO "scorestudentstat" ("description", "id", "rolls", "attended", "repeated", '
+                       '"answer_total", "score_total", "last_time") VALUES (?, ?, 1, ?, ?, ?, ?, ?) '
+                       'ON CONFLICT ("description", "id") DO UPDATE SET ' + _ROLLUP_ADD +
+                       ', "last_time" = max(coalesce("last_time", \'\'), excluded."last_time")')
+UPSERT_DAILY_STAT = ('INSERT INTO "scoredailystat" ("description", "day", "id", "rolls", "attended", "repeated", '
+                     '"answer_total", "score_total") VALUES (?, ?, ?, 1, ?, ?, ?, ?) '
+                     'ON CONFLICT ("description", "day", "id") DO UPDATE SET ' + _ROLLUP_ADD)
+
+
+def get_current_time():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def calc_score(is_attend, is_repeat, answer_condition):
+    score = 0
+    # 每点到一次且到达课堂，则积分+1
+    if is_attend:
+        score += 1
+    else:
+        return 0
+    # 能复述问题则加0.5分，否则扣1分
+    if is_repeat:
+        score += 0.5
+    else:
+        score -= 1
+    # 根据回答问题情况评分
+    return score + answer_condition
+
+
+# 参数来自 querystring 或 body，可能为字符串，需要做类型转换
+def parse_bool(v):
+    if isinstance(v, bool):
+        return v
+    if v is None:
+        return False
+    s = str(v).strip().lower()
+    if s in ("1", "true", "yes", "y", "t"):
+        return True
+    if s in ("0", "false", "no", "n", "f"):
+        return False
+    # 默认：False
+    return False
+
+
+def parse_number(v):
+    if isinstance(v, (int, float)):
+        return float(v)
+    try:
+        return float(str(v))
+    except Exception:
+        return 0.0
+
+
+def write_results(desc, results, now):
+    """Writer job: in-database credits/rolled UPDATE and ScoreModify audit insert with executemany.
+
+    Runs inside the writer's transaction, so concurrent submissions cannot lose each other's increments
+    and the ScoreStudentStat / ScoreDailyStat rollups always match the log.
+    Returns ({sid: (new credits, rolled)}, found sids, class version after the write).
+    """
+    sids = [r[0] for r in results]
+    found = set(sid for (sid,) in Student
+                .select(Student.id)
+                .where((Student.description == desc) & Student.id.in_(sids))
+                .tuples())
+    updates = []
+    modifies = []
+    student_stats = []
+    daily_stats = []
+    for sid, is_attend, is_repeat, answer_condition in results:
+        if sid not in found:
+            continue
+        score = calc_score(is_attend, is_repeat, answer_condition)
+        updates.append((score, sid, desc))
+        modifies.append((sid, desc, now, int(score), is_attend, is_repeat, int(answer_condition)))
+        counts = (int(bool(is_attend)), int(bool(is_repeat)), int(answer_condition), int(score))
+        student_stats.append((desc, sid) + counts + (now,))
+        daily_stats.append((desc, now[:10], sid) + counts)
+    if not updates:
+        return {}, found, None
+    cursor = db.cursor()
+    cursor.executemany(UPDATE_STUDENT, updates)
+    cursor.executemany(INSERT_MODIFY, modifies)
+    cursor.executemany(UPSERT_STUDENT_STAT, student_stats)
+    cursor.executemany(UPSERT_DAILY_STAT, daily_stats)
+    students = {sid: (credits, rolled) for sid, credits, rolled in Student
+                .select(Student.id, Student.credits, Student.rolled)
+                .where((Student.description == desc) & Student.id.in_(list(found)))
+                .tuples()}
+    table.bump_version(desc)
+    return students, found, table.get_version(desc)
+
+
+def apply_results(desc, results):
+    """Apply roll-call results of one class: results is a list of (sid, is_attend, is_repeat, answer_condition).
+
+    The write goes through the group-commit writer; returns ({sid: new credits}, [sids not found in the class]).
+    """
+    results = [(str(sid),) + tuple(rest) for sid, *rest in results]
+    students, found, version = writer.call(write_results, desc, results, get_current_time())
+    credits = {sid: s[0] for sid, s in students.items()}
+    # 提交后再更新内存中的抽样树和排行榜，事务回滚时不会留下未提交的积分
+    if version is not None:
+        sampler.credits_changed(desc, version, credits.items())
+        leaderboard.students_changed(desc, version, ((sid, c, r) for sid, (c, r) in students.items()))
+    return credits, [r[0] for r in results if r[0] not in found]
@@ -1,12 +1,15 @@
+from peewee import JOIN
 from server import vercel
 from server import decorators as dec
 from database import table
+from database import sampler
 import importlib
 from user.login import get_unionid_from_code
 
 db = table.db
 Student = table.Student
 ClassCreater = table.ClassCreater
+ClassVersion = table.ClassVersion
 # 导入标准库 random，避免与本文件名冲突
 _stdlib_random = importlib.import_module("random")
 
@@ -39,64 +42,82 @@ def main(response, data):
 
     desc = data["description"]
     mode = str(data.get('mode', 'random')).lower()
+    # k: 一次抽取 k 个不重复的学生（分组练习），不传时保持返回单个学生
+    k = data.get('k')
+    if k is not None:
+        try:
+            k = int(k)
+        except (TypeError, ValueError):
+            k = 0
+        assert k > 0, "k must be a positive integer."
 
-    db.connect(reuse_if_open=True)
-    klass = ClassCreater.get_or_none((ClassCreater.description == desc) &
-                                     (ClassCreater.creator == token))
-    if not klass:
-        response.send_code(200)
-        response.send_json({
-            "code": 403,
-            "msg": "Unauthorized: Invalid token or class description.",
-            "data": {}
-        })
-        db.close()
-        return
+    with table.connection():
+        # 权限校验和班级数据版本用一次查询取得；版本没有变化时随机抽取不再读取学生表
+        klass = (ClassCreater
+                 .select(ClassCreater.description, ClassVersion.version)
+                 .join(ClassVersion, JOIN.LEFT_OUTER,
+                       on=(ClassVersion.description == ClassCreater.description))
+                 .where((ClassCreater.description == desc) &
+                        (ClassCreater.creator == token))
+                 .tuples()
+                 .first())
+        if not klass:
+            response.send_code(200)
+            response.send_json({
+                "code": 403,
+                "msg": "Unauthorized: Invalid token or class description.",
+                "data": {}
+            })
+            return
+        version = klass[1] or 0
 
-    # Fetch students for the class
-    query = Student.select().where(Student.description == desc)
-    students = list(query)
+        if mode == 'order':
+            # round-robin fairness: fewest rolls first, ties broken by id.
+            # Served by the (description, rolled, id) index, so the cost does not grow with the class
+            students = list(Student
+                            .select(Student.id, Student.name)
+                            .where(Student.description == desc)
+                            .order_by(Student.rolled, Student.id)
+                            .limit(k or 1)
+                            .tuples())
+        else:
+            # weighted random: students with higher credits should have LOWER probability,
+            # weight = 1 / (credits + 1); the per-class Fenwick tree is kept current by roll/result
+            entry = sampler.get(desc, version)
+            students = entry.value
 
     if not students:
         response.send_code(200)
-        response.send_json({"code": 0, "msg": "No students found for this class.", "data": {}})
-        db.close()
+        response.send_json({"code": 0, "msg": "No students found for this class.", "data": {} if k is None else []})
         return
 
     # Choose based on mode
     if mode == 'order':
-        # pick student(s) with minimal 'rolled' count (round-robin fairness)
-        min_rolled = min(s.rolled for s in students)
-        candidates = [s for s in students if s.rolled == min_rolled]
-        # deterministic pick: sort by id then choose first
-        candidates.sort(key=lambda s: s.id)
-        picked = candidates[0]
+        picked = students
+        picked_id, picked_name = students[0]
     else:
-        # weighted random: students with higher credits should have LOWER probability
-        # use inverse weighting: weight = 1 / (credits + 1)
-        try:
-            weights = []
-            for s in students:
-                try:
-                    c = int(s.credits)
-                except Exception:
-                    c = 0
-                weights.append(1.0 / (c + 1))
-            # random.choices supports weights
-            picked = _stdlib_random.choices(students, weights=weights, k=1)[0]
-        except Exception:
-            # fallback to uniform random
-            picked = _stdlib_random.choice(students)
-
+        with entry.lock:
+            if k is None:
+                picked_id, picked_name = entry.value.draw(_stdlib_random)
+            else:
+                # weighted sampling without replacement under the same 1 / (credits + 1) weights
+                picked = entry.value.sample(k, _stdlib_random)
 
-    db.close()
+    if k is not None:
+        response.send_code(200)
+        response.send_json({
+            "code": 0,
+            "msg": "OK",
+            "data": [{"student_id": sid, "student_name": name} for sid, name in picked]
+        })
+        return
 
     response.send_code(200)
     response.send_json({
         "code": 0,
         "msg": "OK",
         "data": {
-            "student_id": picked.id,
-            "student_name": picked.name,
+            "student_id": picked_id,
+            "student_name": picked_name,
         }
-    })
\ No newline at end of file
+    })
@@ -0,0 +1,67 @@
+from server import vercel
+from server import decorators as dec
+from database import table
+from user.login import get_unionid_from_code
+from roll._results import apply_results, parse_bool, parse_number
+
+db = table.db
+ClassCreater = table.ClassCreater
+
+
+@dec.hot_reload
+@vercel.register
+def main(response, data, headers):
+    """Submit a whole lesson's roll-call results in one request.
+
+    Body: { description, results: [ { student_id, is_attend, is_repeat, answer_condition }, ... ] }
+    Every result is applied in one transaction with executemany; students not in the class are
+    returned in `missing` and skipped.
+    """
+    assert "Authorization" in headers, "Missing 'Authorization' header."
+    assert isinstance(data, dict), "Input data must be a dictionary."
+    assert "description" in data, "Input data must contain 'description' field."
+    assert isinstance(data.get("results"), list), "Input data must contain a 'results' list."
+
+    results = []
+    for item in data["results"]:
+        assert isinstance(item, dict), "Each result must be a dictionary."
+        for k in ("student_id", "is_attend", "is_repeat", "answer_condition"):
+            assert k in item, f"Each result must have '{k}' field."
+        results.append((str(item["student_id"]),
+                        parse_bool(item["is_attend"]),
+                        parse_bool(item["is_repeat"]),
+                        parse_number(item["answer_condition"])))
+    # ScoreModify is keyed by (id, description, time): one result per student per submission
+    assert len(set(r[0] for r in results)) == len(results), "Each student may appear only once per submission."
+
+    unionid = get_unionid_from_code(headers["Authorization"])
+    if not unionid:
+        response.send_code(200)
+        response.send_json({
+            "code": 401,
+            "msg": "Invalid or expired Weixin code, please re-login.",
+            "data": []
+        })
+        return
+
+    desc = data["description"]
+    with table.connection():
+        klass = ClassCreater.get_or_none((ClassCreater.description == desc) &
+                                         (ClassCreater.creator == unionid))
+        if not klass:
+            response.send_code(200)
+            response.send_json({
+                "code": 403,
+                "msg": "Unauthorized: Invalid token or class description.",
+                "data": []
+            })
+            return
+        credits, missing = apply_results(desc, results) if results else ({}, [])
+
+    response.send_code(200)
+    response.send_json({
+        "code": 0,
+        "msg": f"{len(credits)} results applied.",
+        "missing": missing,
+        "data": [{"student_id": sid, "credits": c} for sid, c in credits.items()]
+    })
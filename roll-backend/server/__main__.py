@@ -1,8 +1,71 @@
+import argparse
+import os
+
 from . import vercel
 from . import verapi
+from database import create
 
 if __name__ == "__main__":
-    vercel.start(
-        HandlerClass=verapi.handler,
-        port=15444
+    parser = argparse.ArgumentParser(prog="server")
+    parser.add_argument("--engine", choices=("thread", "asyncio"), default="thread",
+                        help="thread: 每个连接一个线程；asyncio: 协程处理连接，线程池执行处理器")
+    parser.add_argument("--port", type=int, default=15444)
+    parser.add_argument("--bind", default=None)
+    parser.add_argument("--threads", type=int, default=32,
+                        help="asyncio 引擎中执行处理器的线程数上限")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="预派生的工作进程数，共享同一个监听端口")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="各工作进程用 SO_REUSEPORT 各自绑定端口，而不是继承父进程的套接字")
+    parser.add_argument("--static", default=None, metavar="DIR",
+                        help="未命中 API 路由的请求从该目录提供静态文件")
+    parser.add_argument("--freeze", action="store_true",
+                        help="生产模式：启动时加载全部处理器，之后不再检查源文件和路由变化")
+    log = parser.add_argument_group("日志")
+    log.add_argument("--log-format", choices=("text", "json"), default="text",
+                     help="json: 每行一个紧凑的 JSON 对象")
+    log.add_argument("--log-max-bytes", type=int, default=10 * 1024 * 1024,
+                     help="server.log 超过该大小后轮转")
+    log.add_argument("--log-backups", type=int, default=5)
+    log.add_argument("--log-buffer", type=int, default=10000,
+                     help="等待写出的日志记录数上限")
+    log.add_argument("--log-overflow", choices=("drop", "drop_oldest", "block"), default="drop",
+                     help="日志队列已满时的处理方式")
+    args = parser.parse_args()
+
+    vercel.verlog.configure(
+        json_format=args.log_format == "json",
+        max_bytes=args.log_max_bytes,
+        backups=args.log_backups,
+        capacity=args.log_buffer,
+        overflow=args.log_overflow
     )
+
+    # 派生工作进程之前建好缺少的表并执行未应用的迁移（PRAGMA user_version 已是最新时什么也不做）
+    create.ensure_db_and_table()
+
+    if args.static:
+        verapi.handler.static_root = os.path.abspath(args.static)
+    if args.freeze:
+        # 在派生工作进程之前预热，子进程直接共享已加载的模块
+        verapi.handler.routes.interval = None
+        vercel.freeze_handlers(verapi.handler.routes)
+
+    if args.engine == "asyncio":
+        from . import verasync
+        verasync.start(
+            HandlerClass=verapi.handler,
+            port=args.port,
+            bind=args.bind,
+            max_workers=args.threads,
+            workers=args.workers,
+            reuse_port=args.reuse_port
+        )
+    else:
+        vercel.start(
+            HandlerClass=verapi.handler,
+            port=args.port,
+            bind=args.bind,
+            workers=args.workers,
+            reuse_port=args.reuse_port
+        )
@@ -1,5 +1,9 @@
 import os
 from . import vercel
+from . import verroute
+
+# 这些包中的每个 .py 文件都是一个 API，例如 roll/random.py -> /roll/random
+ROUTE_PACKAGES = ('roll', 'points', 'students', 'user')
 
 
 def main(handler = vercel.API, port = 8000):
@@ -9,7 +13,39 @@ def main(handler = vercel.API, port = 8000):
     )
 
 class handler(vercel.API):
+    routes = verroute.RouteTable(ROUTE_PACKAGES)
+    static_root = None      # 设置为目录后，未命中路由的请求按静态文件处理
+
     def vercel(self, url, data, headers):
+        path = self.routes.get(url)
+        if path is not None:
+            mod_handler = vercel.load_handler(url, path)
+            if mod_handler:
+                vercel_func = getattr(mod_handler, 'vercel', None)
+                if vercel_func is None:
+                    return vercel.ErrorStatu(self, 503, 'Handler has no vercel method')
+                try:
+                    vercel_func(self, url, data, headers)
+                except Exception as e:
+                    vercel.verlog.name("router")(f"Error in handler {path}")
+                    vercel.verlog.name("router")(f"  {e}")
+                    return vercel.ErrorStatu(self, 503, str(e))
+                return
+
+        if self.static_root is not None:
+            return self.static(self.static_root + self.path.split('?', 1)[0])
+
+        vercel.ErrorStatu(self, 404)
+
+    def static(self, url):
+        '静态文件与目录列表'
+        root = os.path.realpath(self.static_root)
+        path = os.path.realpath(url)
+        # 按完整路径分量比较，/static2 之类的同名前缀目录不算在根目录内
+        if os.path.commonpath([root, path]) != root:
+            return vercel.ErrorStatu(self, 403)
+        url = path + ('/' if url.endswith('/') else '')
+
         if(os.path.isdir(url)):
             self.send_code(200)
             for home in ['index.html','index.htm']:
@@ -26,20 +62,6 @@ class handler(vercel.API):
             self.send_file(url)
             return
 
-        if(os.path.isfile(url + '.py')):
-            mod_handler = vercel.load_handler(url, url + '.py')
-            if mod_handler:
-                vercel_func = getattr(mod_handler, 'vercel', None)
-                if vercel_func is None:
-                    return vercel.ErrorStatu(self, 503, 'Handler has no vercel method')
-                try:
-                    vercel_func(self, url, data, headers)
-                except Exception as e:
-                    vercel.verlog.name("router")(f"Error in handler {url + '.py'}")
-                    vercel.verlog.name("router")(f"  {e}")
-                    return vercel.ErrorStatu(self, 503, str(e))
-                return
-
         vercel.ErrorStatu(self, 404)
 
 
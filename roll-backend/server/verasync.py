@@ -0,0 +1,196 @@
+# coding=utf-8
+'''基于 asyncio 的服务器引擎
+
+空闲的 keep-alive 连接只占用一个协程；请求头读完后，整个请求交给有上限的线程池，
+由原来的 HandlerClass（如 verapi.handler）处理，register 的参数约定保持不变。'''
+
+import asyncio
+import io
+import os
+import sys
+import signal
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from . import vercel
+from .vercel import verlog
+
+
+class BodyReader(io.RawIOBase):
+    '把已读取的请求头和 StreamReader 中的请求体桥接为同步的 rfile'
+    def __init__(self, head, reader, length, loop, timeout):
+        self.head = memoryview(head)
+        self.reader = reader
+        self.left = length
+        self.loop = loop
+        self.timeout = timeout
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.head:
+            size = min(len(buffer), len(self.head))
+            buffer[:size] = self.head[:size]
+            self.head = self.head[size:]
+            return size
+        if self.left <= 0:
+            # 只允许读到本请求的末尾，管线化的下一个请求留在 StreamReader 中
+            return 0
+        read = asyncio.wait_for(self.reader.read(min(len(buffer), self.left)), self.timeout)
+        try:
+            data = asyncio.run_coroutine_threadsafe(read, self.loop).result()
+        except asyncio.TimeoutError:
+            raise TimeoutError('request body timed out')
+        if not data:
+            self.left = 0
+            return 0
+        size = len(data)
+        buffer[:size] = data
+        self.left -= size
+        return size
+
+
+class ResponseWriter(io.RawIOBase):
+    '同步的 wfile，写入时等待事件循环把数据交给传输层（带背压）'
+    def __init__(self, writer, loop):
+        self.writer = writer
+        self.loop = loop
+
+    def writable(self):
+        return True
+
+    async def send(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def write(self, data):
+        data = data if isinstance(data, bytes) else bytes(data)
+        asyncio.run_coroutine_threadsafe(self.send(data), self.loop).result()
+        return len(data)
+
+
+class AsyncServer:
+    '管理监听套接字、连接协程与执行处理器的线程池'
+    def __init__(self, HandlerClass, max_workers = 32):
+        self.HandlerClass = HandlerClass
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = 'vercel')
+        self.timeout = HandlerClass.timeout
+        self.loop = None
+        self.active = 0
+        self.idle = set()       # 正在等待下一个请求头的连接
+        self.tasks = set()
+        self.stopping = False
+
+    def content_length(self, head):
+        '从请求头中取出 Content-Length，不支持的分块请求体视为空'
+        for line in head.split(b'\r\n')[1:]:
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-length':
+                try:
+                    return max(int(value), 0)
+                except ValueError:
+                    return 0
+        return 0
+
+    def handle(self, head, reader, writer, served):
+        '在线程池中执行一次请求，返回处理器实例'
+        handler = self.HandlerClass.__new__(self.HandlerClass)
+        handler.request = None
+        handler.server = self
+        handler.client_address = writer.get_extra_info('peername') or ('', 0)
+        handler.directory = os.getcwd()
+        body = BodyReader(head, reader, self.content_length(head), self.loop, self.timeout)
+        handler.rfile = io.BufferedReader(body)
+        handler.wfile = ResponseWriter(writer, self.loop)
+        handler.requests_served = served - 1
+        handler.close_connection = True
+        try:
+            handler.handle_one_request()
+        except Exception as e:
+            verlog.name('asyncio')(f"Error while handling request: {e}", level = logging.ERROR)
+            handler.close_connection = True
+        if body.left > 0:
+            handler.close_connection = True
+        return handler
+
+    async def connection(self, reader, writer):
+        '一个连接上的请求循环'
+        served = 0
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            while not self.stopping:
+                self.idle.add(writer)
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.timeout)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError):
+                    break
+                finally:
+                    self.idle.discard(writer)
+                served += 1
+                self.active += 1
+                try:
+                    handler = await self.loop.run_in_executor(self.executor, self.handle, head, reader, writer, served)
+                finally:
+                    self.active -= 1
+                if handler.close_connection:
+                    break
+        finally:
+            self.tasks.discard(task)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (Exception, asyncio.CancelledError):
+                # 关闭时事件循环会取消剩余的连接协程，这里只做清理
+                pass
+
+    async def serve(self, sock, grace = 10):
+        '运行到 SIGTERM，然后停止接受连接并等待正在处理的请求'
+        self.loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        self.loop.add_signal_handler(signal.SIGTERM, stop.set)
+        server = await asyncio.start_server(self.connection, sock = sock, backlog = 1024)
+        await stop.wait()
+        server.close()
+        # 空闲的 keep-alive 连接直接关闭；正在处理请求的连接在响应后退出循环
+        self.stopping = True
+        for writer in list(self.idle):
+            writer.close()
+        deadline = self.loop.time() + grace
+        while self.active and self.loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self.tasks:
+            await asyncio.wait(list(self.tasks), timeout = max(0.1, deadline - self.loop.time()))
+
+
+def run(HandlerClass, sock, max_workers = 32):
+    '在一个进程中运行 asyncio 引擎'
+    httpd = AsyncServer(HandlerClass, max_workers)
+    try:
+        asyncio.run(httpd.serve(sock))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.executor.shutdown(wait = False)
+        sock.close()
+
+
+def start(HandlerClass = vercel.API, protocol = "HTTP/1.1",
+          port = 8000, bind = None, max_workers = 32,
+          workers = 1, reuse_port = False):
+    HandlerClass.protocol_version = protocol
+    if workers <= 1:
+        sock = vercel.listen(port, bind)
+        verlog.name('start')(f"Serving HTTP on {sock.getsockname()[0]} port {port} (asyncio, {max_workers} threads)")
+        run(HandlerClass, sock, max_workers)
+        sys.exit(0)
+
+    if reuse_port:
+        target = lambda: run(HandlerClass, vercel.listen(port, bind, reuse_port = True), max_workers)
+    else:
+        sock = vercel.listen(port, bind)
+        target = lambda: run(HandlerClass, sock, max_workers)
+    verlog.name('start')(f"Serving HTTP on {bind or '0.0.0.0'} port {port} with {workers} workers (asyncio, {max_workers} threads each)")
+    vercel.supervise(target, workers)
@@ -4,13 +4,23 @@ from http import server
 from http import HTTPStatus
 
 import io
+import gzip
+import zlib
 import json
 import os
 import sys
+import time
+import signal
+import select
+import socket
 import inspect
+import tempfile
+import atexit
 import logging
 import threading
 import urllib.parse
+from queue import Queue, Full, Empty
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 try:
     from imp import load_source
@@ -22,6 +32,26 @@ except ImportError:
         (s.loader.exec_module(m) is None and m)
     )
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def json_bytes(data):
+    '直接序列化为 UTF-8 字节，安装了 orjson 时使用 orjson'
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option = orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(data, ensure_ascii = False, separators = (',', ':')).encode('utf-8')
+
 
 class ErrorStatu:
     '''<html><head><meta http-equiv="Content-type" content="text/html; charset=utf-8"><title>%s</title><style type="text/css">
@@ -30,13 +60,16 @@ class ErrorStatu:
     h1 { width: 800px; position:relative; left: -100px; letter-spacing: -1px; line-height: 60px; font-size: 60px; font-weight: 100; margin: 0px 0 50px 0; text-shadow: 0 1px 0 #fff; }
     p { color: rgba(0, 0, 0, 0.5); margin: 20px 0; line-height: 1.6; }
     </style></head><body><div class="container"><h1>%d</h1><p><strong>%s</strong></p><p>%s</p></div></body></html>'''
+    pages = {}  # code -> (名称, HTML 正文, JSON 正文)，导入时生成
+
     def __init__(self, Handler, code, more = ''):
         '初始化异常项'
         self.handler = Handler
         self.more = more
         self.Response(code)
 
-    def Error(self, name):
+    @staticmethod
+    def Error(name):
         '命名异常'
         error = name.split('_')
         error = ' '.join(error)
@@ -44,55 +77,228 @@ class ErrorStatu:
 
     def Statu(self, code):
         '通过 code 查找异常'
-        for item in HTTPStatus:
-            if(code==item):
-                return self.Error(item.name)
-        raise AttributeError(code)
+        try:
+            return self.pages[code][0]
+        except KeyError:
+            raise AttributeError(code)
+
+    def Page(self, code):
+        '按 Accept 选择 JSON 或 HTML 正文，没有附加信息时直接使用预先生成的字节'
+        error, html, data = self.pages[code]
+        headers = getattr(self.handler, 'headers', None)
+        accept = headers.get('Accept', '') if headers is not None else ''
+        if 'json' in accept and 'text/html' not in accept:
+            if self.more:
+                data = json.dumps({'code': code, 'msg': error, 'detail': self.more}, ensure_ascii=False).encode('utf-8')
+            return 'application/json; charset=utf-8', data
+        if self.more:
+            html = (self.__doc__%(error, code, error, self.more)).encode('utf-8')
+        return 'text/html; charset=utf-8', html
 
     def Response(self, code):
         '发生异常页面'
-        error = self.Statu(code)
-        doc = self.__doc__%(error, code, error, self.more)
+        if getattr(self.handler, 'framed', False) or getattr(self.handler, 'streaming', False):
+            # 响应已经发出（或正在分块发送），不能再写第二个响应，只能关闭连接
+            self.handler.close_connection = True
+            return
+        if code not in self.pages:
+            raise AttributeError(code)
+        content_type, body = self.Page(code)
+        if getattr(self.handler, 'body_left', None):
+            # 请求体还没有读完，剩余字节无法与下一个请求区分，发出错误后关闭连接
+            self.handler.close_connection = True
+        # 丢弃处理器已缓存但尚未发送的响应头
+        self.handler._headers_buffer = []
         self.handler.send_response(code)
-        self.handler.send_text(doc)
+        self.handler.send_header('Content-Type', content_type)
+        self.handler.send_body(body)
+
+
+for _status in HTTPStatus:
+    _error = ErrorStatu.Error(_status.name)
+    ErrorStatu.pages[_status.value] = (
+        _error,
+        (ErrorStatu.__doc__%(_error, _status.value, _error, '')).encode('utf-8'),
+        json.dumps({'code': _status.value, 'msg': _error}).encode('utf-8'),
+    )
+del _status, _error
+
+
+class LogFormatter(logging.Formatter):
+    '文本格式，将 levelname 和名称居中'
+    def __init__(self):
+        super().__init__('%(asctime)s | %(clevel)s | %(csource)s | %(message)s', datefmt='%H:%M:%S')
+
+    def format(self, record):
+        record.clevel = f"{record.levelname:^7}"
+        record.csource = f"{getattr(record, 'source', record.name):^10}"
+        return super().format(record)
+
+
+class JsonLogFormatter(logging.Formatter):
+    '紧凑的 JSON 行格式，便于批量采集'
+    def format(self, record):
+        line = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'name': getattr(record, 'source', record.name),
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            line['exc'] = self.formatException(record.exc_info)
+        return json.dumps(line, ensure_ascii=False, separators=(',', ':'))
+
+
+class LogQueueHandler(QueueHandler):
+    '把记录放入有界队列；队列满时按 overflow 处理：drop 丢弃新记录，drop_oldest 丢弃最旧记录，block 等待'
+    def __init__(self, queue, overflow = 'drop'):
+        super().__init__(queue)
+        self.overflow = overflow
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 同一进程内的队列不需要序列化，消息的 % 格式化留给后台线程
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record):
+        if self.overflow == 'block':
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+            return
+        except Full:
+            pass
+        if self.overflow == 'drop_oldest':
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+                self.dropped += 1
+                return
+            except (Empty, Full):
+                pass
+        self.dropped += 1
+
+
+class LogQueueListener(QueueListener):
+    '后台写日志的线程'
+    def enqueue_sentinel(self):
+        # 有界队列满时 put_nowait 会失败，结束标记需要等待队列腾出空间
+        self.queue.put(self._sentinel)
+
+
+class LogFileHandler(RotatingFileHandler):
+    '按大小轮转的日志文件；多个工作进程写同一文件时，先检查文件是否已被其他进程轮转'
+    def shouldRollover(self, record):
+        if self.stream is not None:
+            try:
+                current = os.stat(self.baseFilename)
+                opened = os.fstat(self.stream.fileno())
+                rotated = (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+            except OSError:
+                rotated = True
+            if rotated:
+                self.stream.close()
+                self.stream = self._open()
+        return super().shouldRollover(record)
+
+
+class LogName:
+    '带名称的日志入口，可以像 print 一样调用'
+    def __init__(self, log, name):
+        self.log = log
+        self.extra = {'source': name}
+
+    def __call__(self, *values, sep = ' ', end = '\n', file = None, flush = False, level = logging.INFO):
+        self.log.log(level, sep.join(map(str, values)), extra = self.extra)
+
+    def format(self, format, *args, level = logging.INFO):
+        '延迟格式化，% 运算在后台线程中进行'
+        self.log.log(level, format, *args, extra = self.extra)
 
 
 class ServerLog:
-    def __init__(self, name = 'server'):
+    '请求线程只把日志记录放入有界队列，由后台线程写入文件和标准输出'
+    def __init__(self, name = 'server', path = 'server.log'):
         self.log = logging.getLogger(name)
         self.log.setLevel(logging.DEBUG)
-
-        self.formatter = logging.Formatter('%(asctime)s | %(levelname)-7s | %(name)-10s | %(message)s', datefmt='%H:%M:%S')
-
-        self.file_handler = logging.FileHandler('server.log')
+        self.log.propagate = False
+        self.default = LogName(self.log, name)
+        self.path = path
+        self.queue_handler = None
+        self.listener = None
+        self.file_handler = None
+        self.cons_handler = None
+        self.running = False        # 后台线程是否在运行
+        self.configure()
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            # 后台线程不会被 fork 复制，子进程需要自己的队列和线程
+            os.register_at_fork(after_in_child = self.restart)
+
+    def configure(self, json_format = False, max_bytes = 10 * 1024 * 1024, backups = 5,
+                  capacity = 10000, overflow = 'drop'):
+        '设置日志格式、文件轮转大小、队列容量和溢出策略'
+        if overflow not in ('drop', 'drop_oldest', 'block'):
+            raise ValueError(f"Unknown overflow policy {overflow!r}")
+        self.stop()
+        self.formatter = JsonLogFormatter() if json_format else LogFormatter()
+
+        self.file_handler = LogFileHandler(self.path, maxBytes = max_bytes, backupCount = backups, encoding = 'utf-8')
         self.file_handler.setFormatter(self.formatter)
-        self.log.addHandler(self.file_handler)
 
         self.cons_handler = logging.StreamHandler(sys.stdout)
         self.cons_handler.setFormatter(self.formatter)
-        self.log.addHandler(self.cons_handler)
 
-        self.log.addFilter(self.center)
+        self.capacity = capacity
+        self.overflow = overflow
+        self.start()
+
+    def start(self):
+        '创建队列并启动后台线程'
+        if self.queue_handler is not None:
+            self.log.removeHandler(self.queue_handler)
+        self.queue = Queue(self.capacity)
+        self.queue_handler = LogQueueHandler(self.queue, self.overflow)
+        self.log.addHandler(self.queue_handler)
+        self.listener = LogQueueListener(self.queue, self.file_handler, self.cons_handler)
+        self.listener.start()
+        self.running = True
+
+    def restart(self):
+        'fork 后在子进程中重新启动父进程正在运行的后台线程'
+        if self.running:
+            self.start()
+
+    def stop(self):
+        '写完队列中剩余的记录后停止后台线程，并关闭日志文件'
+        if self.running:
+            self.listener.stop()
+            self.running = False
+            if self.queue_handler.dropped:
+                record = logging.makeLogRecord({
+                    'msg': f"{self.queue_handler.dropped} log records dropped (queue full)",
+                    'levelno': logging.WARNING, 'levelname': 'WARNING', 'source': 'log'})
+                self.file_handler.handle(record)
+                self.cons_handler.handle(record)
+        self.listener = None
+        for handler in (self.file_handler, self.cons_handler):
+            if handler is not None:
+                handler.close()
+
+    @property
+    def dropped(self):
+        '因队列已满被丢弃的记录数'
+        return self.queue_handler.dropped
 
     def name(self, name):
         '设置日志名称'
-        self.log.name = name
-        return self
-
-    def center(self, record):
-        '将levelname和name居中'
-        record.levelname = f"{record.levelname:^7}"
-        record.name = f"{record.name:^10}"
-        return True
+        return LogName(self.log, name)
 
     def __call__(self, *values, sep = ' ', end = '\n', file = None, flush = False, level = logging.INFO):
-        if(type(values) == tuple):
-            values = sep.join(map(str, values))
-        if(type(values) == str):
-            values = values.encode('utf-8')
-        if(type(values) == bytes):
-            values = values.decode('utf-8')
-        self.log.log(level, values)
+        self.default(*values, sep = sep, level = level)
 verlog = ServerLog()
 
 
@@ -129,8 +335,160 @@ class URL(server.SimpleHTTPRequestHandler):
         return args
 
     def log_message(self, format, *args):
-        message = format % args
-        verlog.name('server')(message)
+        verlog.name('server').format(format, *args)
+
+
+class MultipartReader:
+    '流式解析 multipart/form-data，按块读取并用 bytes.find 查找分隔符'
+    chunk_size = 64 * 1024          # 每次从 rfile 读取的字节数
+    spool_size = 1024 * 1024        # 单个 part 超过该大小后落盘
+    max_header_size = 16 * 1024     # 单个 part 头部的最大长度
+
+    def __init__(self, stream, length, boundary = ''):
+        self.stream = stream
+        self.remaining = length
+        self.boundary = boundary.encode('latin-1') if isinstance(boundary, str) else boundary
+        # 第一个分隔符前没有 CRLF，补上后所有分隔符形式统一
+        self.buffer = bytearray(b'\r\n')
+
+    def fill(self):
+        '从 rfile 读取下一块，返回是否读到数据'
+        if self.remaining <= 0:
+            return False
+        chunk = self.stream.read(min(self.chunk_size, self.remaining))
+        if not chunk:
+            self.remaining = 0
+            return False
+        self.remaining -= len(chunk)
+        self.buffer += chunk
+        return True
+
+    def drain(self):
+        '丢弃结束分隔符之后的剩余数据，保证连接上的下一个请求可读'
+        while self.remaining > 0:
+            chunk = self.stream.read(min(self.chunk_size, self.remaining))
+            if not chunk:
+                break
+            self.remaining -= len(chunk)
+
+    def sniff_boundary(self):
+        '请求头未声明 boundary 时，取正文第一行作为分隔符'
+        while True:
+            start = self.buffer.find(b'\r\n--')
+            end = self.buffer.find(b'\r\n', start + 2) if start != -1 else -1
+            if end != -1:
+                break
+            if len(self.buffer) > self.max_header_size or not self.fill():
+                raise ValueError('Bad Request')
+        self.boundary = bytes(self.buffer[start + 4:end])
+
+    def pack(self, head):
+        '将 part 头部打包成字典'
+        result = {
+            "Content-Disposition": "",
+            "name": "",
+            "filename": "",
+            "Content-Type": "",
+            "Content" : None    # tempfile.SpooledTemporaryFile()
+        }
+        for item in head.split(b'\r\n'):
+            if item.startswith(b'Content-Disposition:'):
+                attr = item.split(b';')
+                result["Content-Disposition"] = attr[0]
+                for i in range(1, len(attr)):
+                    attr[i] = attr[i].strip()
+                    if attr[i].startswith(b'name='):
+                        result["name"] = attr[i][6:-1]
+                    elif attr[i].startswith(b'filename='):
+                        result["filename"] = attr[i][10:-1].decode()
+            elif item.startswith(b'Content-Type:'):
+                result["Content-Type"] = item[14:]
+        result["Content"] = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        return result
+
+    def parse(self):
+        '解析全部 part，返回与旧实现相同结构的列表'
+        if not self.boundary:
+            self.sniff_boundary()
+        delimiter = b'\r\n--' + self.boundary
+        keep = len(delimiter) - 1
+        buf = self.buffer
+
+        # 跳过前导内容直到第一个分隔符
+        while True:
+            index = buf.find(delimiter)
+            if index != -1:
+                del buf[:index + len(delimiter)]
+                break
+            if len(buf) > keep:
+                del buf[:len(buf) - keep]
+            if not self.fill():
+                raise ValueError('Bad Request')
+
+        result = []
+        while True:
+            # 分隔符之后：'--' 表示结束，否则跳到行尾进入 part 头部
+            while len(buf) < 2 and self.fill():
+                pass
+            if buf[:2] == b'--':
+                break
+            while True:
+                end = buf.find(b'\r\n')
+                if end != -1:
+                    break
+                if len(buf) > self.max_header_size or not self.fill():
+                    raise ValueError('Bad Request')
+            # 头部从分隔符行尾的 CRLF 开始，以空行结束（可以没有头部）
+            while True:
+                head_end = buf.find(b'\r\n\r\n', end)
+                if head_end != -1:
+                    break
+                if len(buf) > self.max_header_size or not self.fill():
+                    raise ValueError('Bad Request')
+            part = self.pack(bytes(buf[end + 2:head_end]))
+            del buf[:head_end + 4]
+
+            content = part["Content"]
+            while True:
+                index = buf.find(delimiter)
+                if index != -1:
+                    with memoryview(buf) as view:
+                        content.write(view[:index])
+                    del buf[:index + len(delimiter)]
+                    break
+                # 末尾可能是半个分隔符，保留 keep 个字节等待下一块
+                if len(buf) > keep:
+                    with memoryview(buf) as view:
+                        content.write(view[:len(buf) - keep])
+                    del buf[:len(buf) - keep]
+                if not self.fill():
+                    content.close()
+                    raise ValueError('Bad Request')
+            content.seek(0)
+            result.append(part)
+
+        self.drain()
+        return result
+
+
+class RequestBody(io.RawIOBase):
+    '只能读到本请求末尾的请求体，剩余字节数记录在处理器的 body_left 上'
+    def __init__(self, handler, length):
+        self.handler = handler
+        handler.body_left = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        left = self.handler.body_left
+        if left <= 0:
+            return 0
+        with memoryview(buffer) as view:
+            # readinto1 有多少返回多少，处理器可以边收边处理
+            size = self.handler.rfile.readinto1(view[:left])
+        self.handler.body_left = left - size
+        return size
 
 
 class DATA(URL):
@@ -180,67 +538,24 @@ class DATA(URL):
             'raw': data
         }
 
-    def parse_data(self, data: bytearray):
-        def bytesplit(data: bytes, sep: bytes):
-            '分割数据块'
-            start = 0
-            for cur in range(len(data) - len(sep) + 1):
-                if data[cur] == sep[0] and data[cur + 1] == sep[1] \
-                and data[cur:cur + len(sep)] == sep:
-                    yield data[start:cur]
-                    start = cur + len(sep)
-            yield data[start:]
-        def bytepack(data: bytearray):
-            '将字节打包成字典'
-            result = {
-                "Content-Disposition": "",
-                "name": "",
-                "filename": "",
-                "Content-Type": "",
-                "Content" : None    # io.BytesIO()
-            }
-            void_line = 0
-            data_start = 0
-            for item in bytesplit(data, b'\r\n'):
-                if void_line == 2:
-                    result["Content"] = io.BytesIO(data[data_start:])
-                    break
-                else:
-                    data_start += len(item) + 2
-                if item.startswith(b'Content-Disposition:'):
-                    attr = item.split(b';')
-                    result["Content-Disposition"] = attr[0]
-                    for i in range(1, len(attr)):
-                        attr[i] = attr[i].strip()
-                        if attr[i].startswith(b'name='):
-                            result["name"] = attr[i][6:-1]
-                        elif attr[i].startswith(b'filename='):
-                            result["filename"] = attr[i][10:-1].decode()
-                elif item.startswith(b'Content-Type:'):
-                    result["Content-Type"] = item[14:]
-                elif item == b'':
-                    void_line += 1
-            return result
-
+    def parse_data(self, stream, length):
         '解析 multipart/form-data 数据'
-        # 获取 boundary
         boundary = ''
-        for item in bytesplit(data, b'\r\n'):
-            if item.startswith(b'--'):
-                boundary = item
+        for param in self.headers.get('Content-Type', '').split(';')[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'boundary':
+                boundary = value.strip('"')
                 break
-        if not boundary:
-            # 如果没有找到 boundary，返回错误
-            ErrorStatu(self, 400, 'Bad Request')
+        reader = MultipartReader(stream, length, boundary)
+        try:
+            return reader.parse()
+        except ValueError as e:
+            # 如果没有找到 boundary 或数据不完整，返回错误；剩余的请求体未读，错误响应后关闭连接
+            self.body_left = reader.remaining
+            ErrorStatu(self, 400, str(e))
             return
-
-        # 分割数据块并解析
-        result = []
-        for part in bytesplit(data, boundary):
-            if len(part) <= 2 or part.startswith(b'--'):
-                continue
-            result.append(bytepack(part))
-        return result
+        finally:
+            self.body_left = reader.remaining
 
 
 #============ data translate ============#
@@ -265,9 +580,19 @@ class DATA(URL):
         if length == 0:
             return self.translate_args()
 
+        method = self.headers.get('Content-Type', '').split(';')[0].strip()
+        if(method == 'multipart/form-data'):
+            # 上传文件可能很大，按块流式解析，不整体读入内存
+            return self.parse_data(self.rfile, length)
+        if(method in self.stream_types):
+            # 逐行处理的格式不在这里读取，处理器从 data['body'] 流式读取
+            data = self.translate_args()
+            data['body'] = io.BufferedReader(RequestBody(self, length), self.stream_buffer_size)
+            return data
+
         data = self.rfile.read(length)
-        if('Content-Type' in self.headers):
-            method = self.headers['Content-Type'].split(';')[0]
+        self.body_left = length - len(data)
+        if(method):
             if  (method == 'application/json'):
                 try:
                     return self.parse_json(data)
@@ -278,8 +603,6 @@ class DATA(URL):
                 return self.parse_form(data)
             elif(method == 'application/xml'):
                 return self.parse_xml(data)
-            elif(method == 'multipart/form-data'):
-                return self.parse_data(data)
             elif(method == 'text/plain'):
                 return self.parse_text(data)
 
@@ -305,25 +628,133 @@ class COOKIE(DATA):
 
 #============ response ============#
 class SEND(COOKIE):
-    def send_file(self, path):
+    def send_connection(self):
+        '根据连接上已处理的请求数决定是否保持连接'
+        if self.protocol_version != 'HTTP/1.1':
+            return
+        if self.close_connection or self.requests_served >= self.max_keepalive_requests:
+            self.send_header('Connection', 'close')
+        else:
+            if self.request_version != 'HTTP/1.1':
+                # HTTP/1.0 客户端需要显式的 keep-alive 应答
+                self.send_header('Connection', 'keep-alive')
+            self.send_header('Keep-Alive', f'timeout={self.timeout}, max={self.max_keepalive_requests - self.requests_served}')
+
+    def accept_encoding(self):
+        '按 Accept-Encoding 选择压缩方式，优先 br（需安装 brotli），其次 gzip'
+        accepted = set()
+        for item in self.headers.get('Accept-Encoding', '').split(','):
+            coding, _, params = item.strip().partition(';')
+            if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(coding.strip().lower())
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted or '*' in accepted:
+            return 'gzip'
+        return None
+
+    def send_body(self, body):
+        '以 Content-Length 定界发送正文，较大的正文按客户端支持压缩'
+        if not hasattr(self, '_headers_buffer'):
+            self._headers_buffer = []
+        if len(body) >= self.compress_min_size:
+            encoding = self.accept_encoding()
+            if encoding == 'br':
+                body = brotli.compress(body, quality = 4)
+            elif encoding == 'gzip':
+                body = gzip.compress(body, compresslevel = 5, mtime = 0)
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+        # 同一 URL 的正文大小会变化，无论这次是否压缩都要声明 Vary，缓存才不会把未压缩的版本给错客户端
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_connection()
+        self._headers_buffer.append(b'\r\n')
+        if self.command == 'HEAD':
+            self.flush_headers()
+        elif len(body) <= self.inline_body_size:
+            # 小正文与头部合并为一次写入
+            self._headers_buffer.append(body)
+            self.flush_headers()
+        else:
+            # 大正文直接写出，避免再拼接复制一次
+            self.flush_headers()
+            self.wfile.write(body)
+        self.framed = True
+
+    def send_chunked(self, compress = False):
+        '开始分块传输的正文：之后用 write_chunk 写出数据，end_chunked 结束；compress 时按客户端支持流式压缩'
+        self.streaming = True
+        self.stream_buffer = []
+        self.stream_buffered = 0
+        self.stream_encoder = None
+        if compress:
+            encoding = self.accept_encoding()
+            if encoding == 'br':
+                encoder = brotli.Compressor(quality = 4)
+                self.stream_encoder = (encoder.process, encoder.flush, encoder.finish)
+            elif encoding == 'gzip':
+                encoder = zlib.compressobj(5, zlib.DEFLATED, 31)
+                self.stream_encoder = (encoder.compress, lambda: encoder.flush(zlib.Z_SYNC_FLUSH), encoder.flush)
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Vary', 'Accept-Encoding')
+        # HTTP/1.0 客户端不支持分块编码，正文只能以关闭连接结束
+        self.chunked = self.request_version == 'HTTP/1.1'
+        if self.chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.close_connection = True
+        self.send_connection()
         self.end_headers()
+
+    def write_chunk(self, data, flush = False, finish = False):
+        '追加正文数据，攒够 stream_buffer_size 或 flush 时作为一个块写出'
+        if self.stream_encoder:
+            process, sync, end = self.stream_encoder
+            data = process(data) if data else b''
+            if finish:
+                data += end()
+            elif flush:
+                data += sync()
+        if data:
+            self.stream_buffer.append(data)
+            self.stream_buffered += len(data)
+        if self.stream_buffered >= self.stream_buffer_size or ((flush or finish) and self.stream_buffered):
+            data = b''.join(self.stream_buffer)
+            self.stream_buffer = []
+            self.stream_buffered = 0
+            if self.command == 'HEAD':
+                return
+            if self.chunked:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            else:
+                self.wfile.write(data)
+
+    def end_chunked(self):
+        '写出剩余数据和结束块，响应完整后连接才能复用'
+        self.write_chunk(b'', finish = True)
+        if self.chunked and self.command != 'HEAD':
+            self.wfile.write(b'0\r\n\r\n')
+        self.streaming = False
+        self.framed = self.chunked
+
+    def send_file(self, path):
         try:
             f = open(path, 'rb')
         except IOError:
             raise IOError('404 Not Found')
-        else:
-            self.copyfile(f, self.wfile)
-            f.close()
+        with f:
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.send_connection()
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.copyfile(f, self.wfile)
+        self.framed = True
 
     def send_text(self, text):
-        self.end_headers()
-        enc = sys.getfilesystemencoding()
-        encoded = text.encode(enc, 'surrogateescape')
-        f = io.BytesIO()
-        f.write(encoded)
-        f.seek(0)
-        self.copyfile(f, self.wfile)
-        f.close()
+        self.send_body(text.encode('utf-8', 'surrogateescape'))
 
     def send_json(self, data: dict | list):
         if not hasattr(self, '_headers_buffer'):
@@ -333,7 +764,33 @@ class SEND(COOKIE):
                 self._headers_buffer.remove(header_str)
                 break
         self.send_header('Content-Type', 'application/json')
-        self.send_text(json.dumps(data, ensure_ascii=False))
+        self.send_body(json_bytes(data))
+
+    def send_etag(self, etag):
+        '发送 ETag，客户端每次使用缓存前都需要验证'
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+
+    def not_modified(self, etag, compress = True):
+        '请求的 If-None-Match 与 etag 匹配（弱比较）时回复 304 并返回 True，否则返回 False；compress 表示对应的 200 响应按 Accept-Encoding 协商'
+        match = self.headers.get('If-None-Match')
+        if not match:
+            return False
+        opaque = lambda tag: tag[2:] if tag.startswith('W/') else tag
+        tags = [opaque(tag.strip()) for tag in match.split(',')]
+        if '*' not in tags and opaque(etag) not in tags:
+            return False
+        self._headers_buffer = []
+        self.send_response(304)
+        self.send_etag(etag)
+        if compress:
+            # 304 要带上 200 响应会有的 Vary
+            self.send_header('Vary', 'Accept-Encoding')
+        # 304 没有正文，也不能带 Content-Length
+        self.send_connection()
+        self.end_headers()
+        self.framed = True
+        return True
 
     def send_headers(self, headers):
         for i in headers:
@@ -345,37 +802,105 @@ class SEND(COOKIE):
 
 class API(SEND):
     server_version = 'vercelHTTP/1.0'
+    compress_min_size = 1024        # 正文达到该大小才压缩
+    inline_body_size = 64 * 1024    # 不超过该大小的正文与头部合并写出
+    timeout = 15                    # keep-alive 连接的空闲超时（秒）
+    max_keepalive_requests = 100    # 单个连接最多处理的请求数
+    max_discard_body = 64 * 1024    # 处理器未读取的请求体不超过该大小时丢弃后复用连接
+    stream_types = ('application/x-ndjson', 'application/jsonl', 'text/csv')   # 请求体交给处理器流式读取
+    stream_buffer_size = 64 * 1024  # 流式读取请求体、分块写出正文时的缓冲大小
+    disable_nagle_algorithm = True
+    requests_served = 0
+
+    def handle_one_request(self):
+        '处理一个请求，并确认连接能否继续复用'
+        self.framed = False
+        self.streaming = False
+        self.body_left = None
+        self.requests_served += 1
+        waiting = getattr(self.server, 'waiting', None)
+        if waiting is not None:
+            # 等待请求行期间登记为空闲，关闭服务器时这些连接会被直接断开
+            with self.server.waiting_lock:
+                if self.server.stopping:
+                    self.close_connection = True
+                    return
+                waiting.add(self.connection)
+        try:
+            super().handle_one_request()
+        finally:
+            if waiting is not None:
+                # 连接关闭或读取超时时不会经过 parse_request
+                with self.server.waiting_lock:
+                    waiting.discard(self.connection)
+        if self.close_connection:
+            return
+        if not self.framed or self.requests_served >= self.max_keepalive_requests:
+            # 响应没有定界（或达到上限）时只能靠关闭连接告知客户端
+            self.close_connection = True
+        elif 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.close_connection = True
+        elif self.body_left is None:
+            # 处理器没有读取请求体（例如带 body 的 GET），丢弃它以便读取下一个请求
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                length = -1
+            if 0 <= length <= self.max_discard_body:
+                self.rfile.read(length)
+            else:
+                self.close_connection = True
+        elif self.body_left:
+            self.close_connection = True
+
+    def parse_request(self):
+        '读到请求行后不再算作空闲连接；服务器已开始关闭时不再处理新请求'
+        waiting = getattr(self.server, 'waiting', None)
+        if waiting is not None:
+            with self.server.waiting_lock:
+                waiting.discard(self.connection)
+                if self.server.stopping:
+                    self.close_connection = True
+                    return False
+        return super().parse_request()
+
+    def dispatch(self, data):
+        '交给路由处理；解析请求体时已经发出错误响应的请求不再分派'
+        if self.framed:
+            return
+        self.vercel(self.translate_path(), data, self.headers)
+
     def do_GET(self):
         self.method = 'GET'
         self.vercel(self.translate_path(), self.translate_args(), self.headers)
 
     def do_POST(self):
         self.method = 'POST'
-        self.vercel(self.translate_path(), self.translate_post(), self.headers)
+        self.dispatch(self.translate_post())
 
     def do_HEAD(self):
         self.method = 'HEAD'
-        self.vercel(self.translate_path(), self.translate_post(), self.headers)
+        self.dispatch(self.translate_post())
 
     def do_CONNECT(self):
         self.method = 'CONNECT'
-        self.vercel(self.translate_path(), self.translate_post(), self.headers)
+        self.dispatch(self.translate_post())
 
     def do_OPTIONS(self):
         self.method = 'OPTIONS'
-        self.vercel(self.translate_path(), self.translate_post(), self.headers)
+        self.dispatch(self.translate_post())
 
     def do_FATCH(self):
         self.method = 'FATCH'
-        self.vercel(self.translate_path(), self.translate_post(), self.headers)
+        self.dispatch(self.translate_post())
 
     def do_PUT(self):
         self.method = 'PUT'
-        self.vercel(self.translate_path(), self.translate_post(), self.headers)
+        self.dispatch(self.translate_post())
 
     def do_DELETE(self):
         self.method = 'DELETE'
-        self.vercel(self.translate_path(), self.translate_post(), self.headers)
+        self.dispatch(self.translate_post())
 
 
 class register:
@@ -427,39 +952,230 @@ class daemon:
             verlog.name('daemon')(f"Thread {self.thread.name} is already running.", level=logging.WARNING)
 
 
+def listen(port = 8000, bind = None, reuse_port = False):
+    '创建监听套接字，reuse_port 时各进程可以各自绑定同一端口'
+    info = socket.getaddrinfo(bind, port,
+                              type  = socket.SOCK_STREAM,
+                              flags = socket.AI_PASSIVE)[0]
+    sock = socket.socket(info[0], socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(info[4])
+    sock.listen(1024)
+    return sock
+
+
+def supervise(run, workers, grace = 10):
+    '预派生 workers 个子进程执行 run()，异常退出的子进程会被重启，SIGTERM/SIGINT 时优雅关闭'
+    children = {}
+    stopping = False
+    # 信号到达时写入唤醒管道：waitpid 被信号打断后会自动重试（PEP 475），只靠标志位主循环醒不过来
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.set_wakeup_fd(-1)
+                os.close(wakeup_r)
+                os.close(wakeup_w)
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                # 终端的 Ctrl-C 交给父进程统一处理，子进程只响应 SIGTERM
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                run()
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 0
+            except KeyboardInterrupt:
+                code = 0
+            except BaseException as e:
+                verlog.name('worker')(f"Worker {os.getpid()} crashed: {e}", level=logging.ERROR)
+                code = 1
+            finally:
+                verlog.stop()
+                os._exit(code)
+        children[pid] = (slot, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    # 子进程退出时也唤醒主循环
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    for slot in range(workers):
+        spawn(slot)
+    verlog.name('start')(f"Supervising {workers} workers: {' '.join(map(str, children))}")
+
+    deadline = None
+    while children:
+        if stopping and deadline is None:
+            deadline = time.monotonic() + grace
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if stopping and time.monotonic() > deadline:
+                for pid in children:
+                    verlog.name('worker')(f"Worker {pid} did not exit in {grace}s, killing it", level=logging.WARNING)
+                    os.kill(pid, signal.SIGKILL)
+                deadline = float('inf')
+            # 等待 SIGCHLD/SIGTERM/SIGINT 写入唤醒管道；超时只是兜底
+            select.select([wakeup_r], [], [], 0.1 if stopping else 1)
+            try:
+                os.read(wakeup_r, 512)
+            except BlockingIOError:
+                pass
+            continue
+        slot, started = children.pop(pid)
+        if stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        verlog.name('worker')(f"Worker {pid} exited with {code}, restarting", level=logging.WARNING)
+        if time.monotonic() - started < 1:
+            # 刚启动就退出，避免重启风暴
+            time.sleep(1)
+        spawn(slot)
+    sys.exit(0)
+
+
+def serve(HandlerClass, ServerClass, sock, grace = 10):
+    '在已监听的套接字上运行服务器，直到 KeyboardInterrupt 或 SIGTERM'
+    ServerClass.address_family = sock.family
+    httpd = ServerClass(sock.getsockname()[:2], HandlerClass, bind_and_activate = False)
+    httpd.socket.close()
+    httpd.socket = sock
+    httpd.server_address = sock.getsockname()
+    httpd.server_name, httpd.server_port = httpd.server_address[:2]
+
+    # 记录处理连接的线程，关闭时等待它们完成；等待下一个请求行的 keep-alive 连接记在 waiting 中
+    active = set()
+    httpd.waiting = set()
+    httpd.waiting_lock = threading.Lock()
+    httpd.stopping = False
+    process = httpd.process_request_thread
+    def tracked(request, client_address):
+        active.add(threading.current_thread())
+        try:
+            process(request, client_address)
+        finally:
+            active.discard(threading.current_thread())
+    httpd.process_request_thread = tracked
+
+    def terminate(signum, frame):
+        # shutdown 会等待 serve_forever 退出，不能在主线程中直接调用
+        threading.Thread(target = httpd.shutdown, daemon = True).start()
+    signal.signal(signal.SIGTERM, terminate)
+
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        grace = 0
+    finally:
+        httpd.server_close()
+    # 空闲连接直接断开，它们的线程从 readline 返回后立即退出；正在处理请求的连接在响应后关闭
+    with httpd.waiting_lock:
+        httpd.stopping = True
+        for conn in httpd.waiting:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        httpd.waiting.clear()
+    # 不再接受新连接后，给正在处理的请求留出完成的时间
+    deadline = time.monotonic() + grace
+    for thread in list(active):
+        thread.join(max(0, deadline - time.monotonic()))
+
+
 def start(HandlerClass = API,
           ServerClass  = server.ThreadingHTTPServer,
-          protocol = "HTTP/1.0", port = 8000, bind = None):
-    import socket
-    info = socket.getaddrinfo(bind, port, 
-                               type  = socket.SOCK_STREAM,
-                               flags = socket.AI_PASSIVE)[0]
-    ServerClass.address_family = info[0]
+          protocol = "HTTP/1.1", port = 8000, bind = None,
+          workers = 1, reuse_port = False):
     HandlerClass.protocol_version = protocol
-    with ServerClass(info[4], HandlerClass) as httpd:
-        verlog.name('start')(f"Serving HTTP on {info[4][0]} port {port}")
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            sys.exit(0)
+    if workers <= 1:
+        sock = listen(port, bind)
+        verlog.name('start')(f"Serving HTTP on {sock.getsockname()[0]} port {port}")
+        serve(HandlerClass, ServerClass, sock)
+        sys.exit(0)
+
+    if reuse_port:
+        # 每个工作进程各自绑定，由内核在它们之间分配连接
+        run = lambda: serve(HandlerClass, ServerClass, listen(port, bind, reuse_port = True))
+    else:
+        # 父进程监听，工作进程继承同一个 fd
+        sock = listen(port, bind)
+        run = lambda: serve(HandlerClass, ServerClass, sock)
+    verlog.name('start')(f"Serving HTTP on {bind or '0.0.0.0'} port {port} with {workers} workers")
+    supervise(run, workers)
+
+
+__module_cache = {}     # name -> (module, 源文件时间戳)
+__module_lock = threading.Lock()
+__frozen = False        # 生产模式：预热后不再检查源文件
+
+
+def source_stamp(path):
+    '源文件的修改时间与大小，任一变化都视为文件已修改'
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
 
 
-__module_cache = {}
 def load_handler(name, path):
-    if name in __module_cache:
-        return getattr(__module_cache[name], 'handler', None)
-    try:
-        mod = load_source(name, path)
-    except Exception as e:
-        verlog.name('load_handler')(f"Error loading module {name}: {e}", level=logging.ERROR)
-        return None
-    mod_handler = getattr(mod, 'handler', None)
-    if mod_handler is None:
-        verlog.name('load_handler')(f"Failed to load handler from module {name}", level=logging.ERROR)
-        return None
-    if not hasattr(mod_handler, 'hot_reload'):
-        __module_cache[name] = mod
-    return mod_handler
+    cached = __module_cache.get(name)
+    if cached is not None:
+        mod, stamp = cached
+        mod_handler = getattr(mod, 'handler', None)
+        if __frozen or not hasattr(mod_handler, 'hot_reload'):
+            return mod_handler
+        if source_stamp(path) == stamp:
+            return mod_handler
+
+    with __module_lock:
+        # 等锁期间其他线程可能已经完成了重新加载
+        stamp = source_stamp(path)
+        cached = __module_cache.get(name)
+        if cached is not None and cached[1] == stamp:
+            return getattr(cached[0], 'handler', None)
+        try:
+            mod = load_source(name, path)
+        except Exception as e:
+            verlog.name('load_handler')(f"Error loading module {name}: {e}", level=logging.ERROR)
+            return None
+        mod_handler = getattr(mod, 'handler', None)
+        if mod_handler is None:
+            verlog.name('load_handler')(f"Failed to load handler from module {name}", level=logging.ERROR)
+            return None
+        if cached is not None:
+            verlog.name('load_handler')(f"Reloaded {path}")
+        __module_cache[name] = (mod, stamp)
+        return mod_handler
+
+
+def freeze_handlers(routes):
+    '加载所有路由的处理器，此后不再检查源文件是否修改'
+    global __frozen
+    for name, path in routes:
+        load_handler(name, path)
+    __frozen = True
+    verlog.name('load_handler')(f"Froze {len(__module_cache)} handlers")
 
 
 '''HTTP/1.1协议中共定义了八种方法（有时也叫“动作”）来表明Request-URI指定的资源的不同操作方式：
@@ -0,0 +1,72 @@
+# coding=utf-8
+'''路由表
+
+启动时扫描处理器所在的包，建立请求路径到脚本路径的映射，分发时只做一次字典查找。
+以下划线开头的文件和目录不会成为路由，可以放模块内部使用的辅助代码。'''
+
+import os
+import time
+import threading
+
+
+class RouteTable:
+    '请求路径（translate_path 的结果，不含 .py）到处理器脚本的映射'
+    def __init__(self, packages, root = None, interval = 2.0):
+        self.root = os.path.abspath(root or os.getcwd())
+        self.packages = tuple(packages)
+        self.interval = interval    # 两次检查目录变化的最小间隔（秒），None 表示不再检查
+        self.lock = threading.Lock()
+        self.checked = time.monotonic()
+        self.routes, self.stamps = self.scan()
+
+    def stamp(self, path):
+        '目录的修改时间，增删文件时会变化'
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def scan(self):
+        '遍历所有包，返回 (路由, 目录时间戳)'
+        routes = {}
+        stamps = {}
+        for package in self.packages:
+            top = os.path.join(self.root, package)
+            stamps[top] = self.stamp(top)
+            for dirpath, dirnames, filenames in os.walk(top):
+                dirnames[:] = [d for d in dirnames if not d.startswith(('.', '_'))]
+                stamps[dirpath] = self.stamp(dirpath)
+                for filename in filenames:
+                    name, ext = os.path.splitext(filename)
+                    if ext != '.py' or name.startswith('_'):
+                        continue
+                    routes[os.path.join(dirpath, name)] = os.path.join(dirpath, filename)
+        return routes, stamps
+
+    def refresh(self):
+        '目录有增删时重建路由表，返回是否重建'
+        for path, stamp in self.stamps.items():
+            if self.stamp(path) != stamp:
+                break
+        else:
+            return False
+        self.routes, self.stamps = self.scan()
+        return True
+
+    def get(self, url):
+        '查找路由，必要时顺便检查目录是否变化'
+        if self.interval is not None:
+            now = time.monotonic()
+            if now - self.checked > self.interval and self.lock.acquire(blocking = False):
+                try:
+                    self.checked = now
+                    self.refresh()
+                finally:
+                    self.lock.release()
+        return self.routes.get(url)
+
+    def __iter__(self):
+        return iter(self.routes.items())
+
+    def __len__(self):
+        return len(self.routes)
@@ -0,0 +1,115 @@
+"""Streaming CSV / XLSX writers for the export endpoints.
+
+Both take a `write(bytes)` callable (e.g. response.write_chunk) and row iterators,
+and never hold more than a small buffer of rows in memory.
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+ROWS_PER_WRITE = 500    # rows encoded before handing a block to write()
+
+# characters that are not allowed in XML 1.0 documents
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{sheets}</Types>'
+)
+_SHEET_TYPE = ('<Override PartName="/xl/worksheets/sheet{n}.xml" '
+               'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>')
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}</Relationships>'
+)
+_SHEET_REL = ('<Relationship Id="rId{n}" Target="worksheets/sheet{n}.xml" '
+              'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>')
+_SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+class _ChunkFile(io.RawIOBase):
+    """Write-only, non-seekable file object; zipfile then streams entries with data descriptors."""
+    def __init__(self, write):
+        self._write = write
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._write(bytes(data))
+        return len(data)
+
+
+def write_csv(write, header, rows):
+    """Stream rows as UTF-8 CSV with a BOM so Excel detects the encoding."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % ROWS_PER_WRITE == 0:
+            write(buffer.getvalue().encode("utf-8"))
+            buffer.seek(0)
+            buffer.truncate()
+    write(buffer.getvalue().encode("utf-8"))
+
+
+def _cell(value):
+    if isinstance(value, bool):
+        return '<c t="b"><v>%d</v></c>' % value
+    if isinstance(value, (int, float)):
+        return "<c><v>%r</v></c>" % value
+    text = escape(_XML_ILLEGAL.sub("", "" if value is None else str(value)))
+    return '<c t="inlineStr"><is><t xml:space="preserve">%s</t></is></c>' % text
+
+
+def write_xlsx(write, sheets):
+    """Stream a workbook; sheets is a list of (name, header, rows).
+
+    Cells use inline strings, so no shared-string table has to be collected before writing.
+    """
+    with zipfile.ZipFile(_ChunkFile(write), "w", zipfile.ZIP_DEFLATED, compresslevel=5) as book:
+        numbers = range(1, len(sheets) + 1)
+        book.writestr("[Content_Types].xml", _CONTENT_TYPES.format(
+            sheets="".join(_SHEET_TYPE.format(n=n) for n in numbers)))
+        book.writestr("_rels/.rels", _ROOT_RELS)
+        book.writestr("xl/workbook.xml", _WORKBOOK.format(sheets="".join(
+            '<sheet name="%s" sheetId="%d" r:id="rId%d"/>' % (escape(name, {'"': "&quot;"}), n, n)
+            for n, (name, _, _) in zip(numbers, sheets))))
+        book.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS.format(
+            sheets="".join(_SHEET_REL.format(n=n) for n in numbers)))
+        for n, (_, header, rows) in zip(numbers, sheets):
+            with book.open(f"xl/worksheets/sheet{n}.xml", "w") as sheet:
+                sheet.write(_SHEET_HEAD.encode("utf-8"))
+                block = ["<row>" + "".join(map(_cell, header)) + "</row>"]
+                for row in rows:
+                    block.append("<row>" + "".join(map(_cell, row)) + "</row>")
+                    if len(block) >= ROWS_PER_WRITE:
+                        sheet.write("".join(block).encode("utf-8"))
+                        block = []
+                block.append(_SHEET_TAIL)
+                sheet.write("".join(block).encode("utf-8"))
@@ -1,6 +1,7 @@
 from server import vercel
 from server import decorators as dec
 from database import table
+from database import writer
 from user.login import get_unionid_from_code
 
 db = table.db
@@ -25,43 +26,44 @@ def main(response, data, headers):
         })
         return
 
-    db.connect(reuse_if_open=True)
-    # find all classes created by this user
-    classes = list(ClassCreator.select().where(ClassCreator.creator == unionid))
-    if not classes:
-        db.close()
-        response.send_code(200)
-        response.send_json({
-            "code": 0,
-            "msg": "No classes to delete.",
-            "deleted_classes": 0,
-            "deleted_students": 0,
-            "deleted_score_mods": 0
-        })
-        return
+    with table.connection():
+        # find all classes created by this user
+        classes = list(ClassCreator.select().where(ClassCreator.creator == unionid))
+        if not classes:
+            response.send_code(200)
+            response.send_json({
+                "code": 0,
+                "msg": "No classes to delete.",
+                "deleted_classes": 0,
+                "deleted_students": 0,
+                "deleted_score_mods": 0
+            })
+            return
+
+        descriptions = [c.description for c in classes]
 
-    descriptions = [c.description for c in classes]
-    deleted_classes = 0
-    deleted_students = 0
-    deleted_score_mods = 0
-    try:
-        with db.atomic():
+        def delete():
             # delete students
-            deleted_students = Student.delete().where(Student.description.in_(descriptions)).execute()
+            students = Student.delete().where(Student.description.in_(descriptions)).execute()
             # delete score modifications
-            deleted_score_mods = ScoreModify.delete().where(ScoreModify.description.in_(descriptions)).execute()
+            score_mods = ScoreModify.delete().where(ScoreModify.description.in_(descriptions)).execute()
+            for stat in (table.ScoreStudentStat, table.ScoreDailyStat):
+                stat.delete().where(stat.description.in_(descriptions)).execute()
             # delete class entries
-            deleted_classes = ClassCreator.delete().where(ClassCreator.description.in_(descriptions)).execute()
-    except Exception as e:
-        db.close()
-        response.send_code(200)
-        response.send_json({
-            "code": 500,
-            "msg": f"Deletion failed: {str(e)}",
-        })
-        return
+            classes = ClassCreator.delete().where(ClassCreator.description.in_(descriptions)).execute()
+            table.bump_version(*descriptions)
+            return classes, students, score_mods
+
+        try:
+            deleted_classes, deleted_students, deleted_score_mods = writer.call(delete)
+        except Exception as e:
+            response.send_code(200)
+            response.send_json({
+                "code": 500,
+                "msg": f"Deletion failed: {str(e)}",
+            })
+            return
 
-    db.close()
     response.send_code(200)
     response.send_json({
         "code": 0,
@@ -1,6 +1,7 @@
 from server import vercel
 from server import decorators as dec
 from database import table
+from database import writer
 from user.login import get_unionid_from_code
 
 db = table.db
@@ -27,33 +28,36 @@ def main(response, data, headers):
         return
     class_desc = data["description"]
 
-    db.connect(reuse_if_open=True)
-    klass: ClassCreator = ClassCreator.get_or_none(ClassCreator.description == class_desc)
-    if not klass:
-        response.send_code(200)
-        response.send_json({
-            "code": 404,
-            "msg": f"Class with description '{class_desc}' not found.",
-        })
-        db.close()
-        return
-    if klass.creator != unionid:
-        response.send_code(200)
-        response.send_json({
-            "code": 403,
-            "msg": "Invalid authentication token.",
-        })
-        db.close()
-        return
-    
-    with db.atomic():
-        # Delete all students associated with the class
-        Student.delete().where(Student.description == class_desc).execute()
-        # Delete the class itself
-        klass.delete_instance()
-        # Delete all score modifications associated with the class
-        ScoreModify.delete().where(ScoreModify.description == class_desc).execute()
-    db.close()
+    with table.connection():
+        klass: ClassCreator = ClassCreator.get_or_none(ClassCreator.description == class_desc)
+        if not klass:
+            response.send_code(200)
+            response.send_json({
+                "code": 404,
+                "msg": f"Class with description '{class_desc}' not found.",
+            })
+            return
+        if klass.creator != unionid:
+            response.send_code(200)
+            response.send_json({
+                "code": 403,
+                "msg": "Invalid authentication token.",
+            })
+            return
+
+        def delete():
+            # Delete all students associated with the class
+            Student.delete().where(Student.description == class_desc).execute()
+            # Delete the class itself
+            ClassCreator.delete().where(ClassCreator.description == class_desc).execute()
+            # Delete all score modifications associated with the class
+            ScoreModify.delete().where(ScoreModify.description == class_desc).execute()
+            for stat in (table.ScoreStudentStat, table.ScoreDailyStat):
+                stat.delete().where(stat.description == class_desc).execute()
+            # Keep the version row so a re-created class never reuses an old ETag
+            table.bump_version(class_desc)
+
+        writer.call(delete)
 
     response.send_code(200)
     response.send_json({
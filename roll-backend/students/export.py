@@ -1,12 +1,67 @@
+import urllib.parse
+
 from server import vercel
 from server import decorators as dec
 from database import table
 from user.login import get_unionid_from_code
+from students import _sheets
 
 db = table.db
 Student = table.Student
+ScoreModify = table.ScoreModify
 classCreator = table.ClassCreater
 
+# format=csv / xlsx streams a file built on the server instead of the JSON list
+FILE_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+STUDENT_HEADER = ["student_id", "student_name", "student_major", "credits", "random_rolls", "description"]
+HISTORY_HEADER = ["student_id", "time", "modify", "is_attend", "is_repeat", "answer_condition"]
+
+
+def student_rows(class_desc):
+    """Streaming cursor over the class's students (rows are not cached by peewee)."""
+    return (Student
+            .select(Student.id, Student.name, Student.major, Student.credits, Student.rolled, Student.description)
+            .where(Student.description == class_desc)
+            .tuples()
+            .iterator())
+
+
+def history_rows(class_desc):
+    """Streaming cursor over the class's score modifications, oldest first."""
+    return (ScoreModify
+            .select(ScoreModify.id, ScoreModify.time, ScoreModify.modify,
+                    ScoreModify.is_attend, ScoreModify.is_repeat, ScoreModify.answer_condition)
+            .where(ScoreModify.description == class_desc)
+            .order_by(ScoreModify.time)
+            .tuples()
+            .iterator())
+
+
+def send_file(response, class_desc, file_format, sheet, etag):
+    """Stream the export with chunked transfer encoding straight from the cursors."""
+    filename = f"{class_desc}.{file_format}"
+    response.send_code(200)
+    response.send_header("Content-Type", FILE_TYPES[file_format])
+    response.send_header("Content-Disposition", "attachment; filename=\"students.%s\"; filename*=UTF-8''%s"
+                         % (file_format, urllib.parse.quote(filename)))
+    response.send_etag(etag)
+    # xlsx is already deflated, only CSV is worth compressing on the wire
+    response.send_chunked(compress=file_format == "csv")
+    if file_format == "csv":
+        if sheet == "history":
+            _sheets.write_csv(response.write_chunk, HISTORY_HEADER, history_rows(class_desc))
+        else:
+            _sheets.write_csv(response.write_chunk, STUDENT_HEADER, student_rows(class_desc))
+    else:
+        _sheets.write_xlsx(response.write_chunk, [
+            ("students", STUDENT_HEADER, student_rows(class_desc)),
+            ("score_history", HISTORY_HEADER, history_rows(class_desc)),
+        ])
+    response.end_chunked()
+
 @dec.hot_reload
 @vercel.register
 def main(response, data, headers):
@@ -25,42 +80,53 @@ def main(response, data, headers):
         })
         return
     class_desc = data["description"]
+    file_format = str(data.get("format", "json")).lower()
+    assert file_format == "json" or file_format in FILE_TYPES, "Format must be 'json', 'csv' or 'xlsx'."
+    sheet = str(data.get("sheet", "students")).lower()
+    assert sheet in ("students", "history"), "Sheet must be 'students' or 'history'."
 
-    db.connect(reuse_if_open=True)
-    klass: classCreator = classCreator.get_or_none(classCreator.description == class_desc)
-    if not klass:
-        response.send_code(200)
-        response.send_json({
-            "code": 404,
-            "msg": f"Class with description '{class_desc}' not found.",
-            "data": []
-        })
-        db.close()
-        return
-    if klass.creator != unionid:
-        response.send_code(200)
-        response.send_json({
-            "code": 403,
-            "msg": "Invalid authentication token.",
-            "data": []
-        })
-        db.close()
-        return
-    
-    student_menu = []
-    for student in Student.select().where(Student.description == class_desc):
-        student_menu.append({
-            "id": student.id,
-            "student_id": student.id,
-            "student_name": student.name,
-            "student_major": student.major,
-            "credits": student.credits,
-            "random_rolls": student.rolled,
-            "description": student.description
-        })
+    with table.connection():
+        klass: classCreator = classCreator.get_or_none(classCreator.description == class_desc)
+        if not klass:
+            response.send_code(200)
+            response.send_json({
+                "code": 404,
+                "msg": f"Class with description '{class_desc}' not found.",
+                "data": []
+            })
+            return
+        if klass.creator != unionid:
+            response.send_code(200)
+            response.send_json({
+                "code": 403,
+                "msg": "Invalid authentication token.",
+                "data": []
+            })
+            return
+
+        etag = table.make_etag("export", class_desc, table.get_version(class_desc), file_format, sheet)
+        if response.not_modified(etag, compress=file_format != "xlsx"):
+            return
+
+        if file_format in FILE_TYPES:
+            send_file(response, class_desc, file_format, sheet, etag)
+            return
+
+        student_menu = []
+        for student in Student.select().where(Student.description == class_desc):
+            student_menu.append({
+                "id": student.id,
+                "student_id": student.id,
+                "student_name": student.name,
+                "student_major": student.major,
+                "credits": student.credits,
+                "random_rolls": student.rolled,
+                "description": student.description
+            })
 
 
     response.send_code(200)
+    response.send_etag(etag)
     response.send_json({
         "code": 0,
         "msg": "Success",
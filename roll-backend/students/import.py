@@ -1,6 +1,7 @@
 from server import vercel
 from server import decorators as dec
 from database import table
+from database import writer
 from user.login import get_unionid_from_code
 
 db = table.db
@@ -14,6 +15,8 @@ def main(response, data, headers):
     assert isinstance(data, dict), "Input data must be a dictionary."
     assert "description" in data, "Input data must contain 'description' field."
     assert "students" in data, "Input data must contain 'students' field."
+    # validate and collect the rows in one pass
+    rows = []
     for item in data["students"]:
         # basic validations
         assert isinstance(item, dict), "Each student record must be a dictionary."
@@ -26,11 +29,7 @@ def main(response, data, headers):
         assert isinstance(sid, str) and sid.strip() != "", "student_id must be a non-empty string"
         assert isinstance(name, str) and name.strip() != "", "student_name must be a non-empty string"
         assert isinstance(major, str) and major.strip() != "", "student_major must be a non-empty string"
-
-    db.connect(reuse_if_open=True)
-
-    inserted = 0
-    updated = 0
+        rows.append((sid, name, major))
 
     token_code = headers["Authorization"]
     # exchange code for unionid/openid; require successful exchange
@@ -41,34 +40,19 @@ def main(response, data, headers):
             "code": 401,
             "msg": "Invalid or expired Weixin code, please re-login.",
         })
-        db.close()
         return
     description = data["description"]
-    klass = classCreator.get_or_none(classCreator.description == description)
-    if not klass:
-        classCreator.create(description=description, creator=unionid)
-
-    for item in data["students"]:
-        sid = item["student_id"]
-        name = item["student_name"]
-        major = item["student_major"]
 
-        # upsert: if exists update, otherwise create
-        # and the description must as same as provided description
-        existing: Student = Student.get_or_none((Student.id == sid) &
-                                                (Student.description == description))
-        if existing:
-            # update fields
-            existing.name = name
-            existing.major = major
-            existing.save()
-            updated += 1
-        else:
-            Student.create(id=sid, name=name, major=major, 
-                           description=description)
-            inserted += 1
+    def write():
+        # one transaction: chunked INSERT ... ON CONFLICT(id, description) DO UPDATE
+        klass = classCreator.get_or_none(classCreator.description == description)
+        if not klass:
+            classCreator.create(description=description, creator=unionid)
+        result = table.upsert_students(description, rows)
+        table.bump_version(description)
+        return result
 
-    db.close()
+    inserted, updated = writer.call(write)
 
     # return a concise summary
     response.send_code(200)
@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+
+from server import vercel
+from server import decorators as dec
+from database import table
+from database import writer
+from user.login import get_unionid_from_code
+
+db = table.db
+classCreator = table.ClassCreater
+
+BATCH_ROWS = 1000        # rows written per transaction
+MAX_ERROR_EVENTS = 1000  # per-row errors reported one by one; later ones are only counted
+FIELDS = ("student_id", "student_name", "student_major")
+
+
+def event(**fields):
+    """One line of the NDJSON response."""
+    return vercel.json_bytes(fields) + b"\n"
+
+
+def read_ndjson(body):
+    """Yield (line, record, error) for every non-empty line of an NDJSON body."""
+    text = io.TextIOWrapper(body, encoding="utf-8-sig", errors="replace")
+    for line_no, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line), None
+        except ValueError as e:
+            yield line_no, None, f"Invalid JSON: {e}"
+
+
+def read_csv(body):
+    """Yield (line, record, error) for every row of a CSV body with a header row."""
+    reader = csv.DictReader(io.TextIOWrapper(body, encoding="utf-8-sig", errors="replace", newline=""))
+    for record in reader:
+        yield reader.line_num, record, None
+
+
+def validate(record, default_description):
+    """Return ((description, (sid, name, major)), None) or (None, error message)."""
+    if not isinstance(record, dict):
+        return None, "Each student record must be an object."
+    values = []
+    for k in FIELDS:
+        v = record.get(k)
+        if not isinstance(v, str) or v.strip() == "":
+            return None, f"'{k}' must be a non-empty string"
+        values.append(v)
+    description = record.get("description") or default_description
+    if not isinstance(description, str) or description.strip() == "":
+        return None, "'description' must be given per row or in the query string"
+    return (description, tuple(values)), None
+
+
+def claim_class(description, unionid):
+    """Writer job: create the class for this user if it is new, return its owner."""
+    classCreator.insert(description=description, creator=unionid).on_conflict_ignore().execute()
+    return classCreator.get_by_id(description).creator
+
+
+def write_batch(batch):
+    """Writer job: upsert one batch (description -> rows), returns (inserted, updated)."""
+    inserted = updated = 0
+    for description, rows in batch.items():
+        i, u = table.upsert_students(description, rows)
+        inserted += i
+        updated += u
+    table.bump_version(*batch)
+    return inserted, updated
+
+
+def flush(batch, stats):
+    inserted, updated = writer.call(write_batch, batch)
+    stats["inserted"] += inserted
+    stats["updated"] += updated
+
+
+@dec.hot_reload
+@vercel.register
+def main(response, data, headers):
+    assert "Authorization" in headers, "Missing Authorization header."
+    assert isinstance(data, dict) and "body" in data, \
+        "Request body must be NDJSON (application/x-ndjson) or CSV (text/csv)."
+
+    unionid = get_unionid_from_code(headers["Authorization"])
+    if not unionid:
+        response.send_code(200)
+        response.send_json({
+            "code": 401,
+            "msg": "Invalid or expired Weixin code, please re-login.",
+        })
+        return
+
+    is_csv = headers.get("Content-Type", "").split(";")[0].strip() == "text/csv"
+    records = read_csv(data["body"]) if is_csv else read_ndjson(data["body"])
+    default_description = data.get("description")
+
+    # progress and per-row errors are streamed back as NDJSON while the body is still being read
+    response.send_code(200)
+    response.send_header("Content-Type", "application/x-ndjson")
+    response.send_chunked()
+
+    stats = {"rows": 0, "inserted": 0, "updated": 0, "errors": 0}
+    owners = {}     # description -> whether this user may write to it
+    batch = {}
+    pending = 0
+    with table.connection():
+        try:
+            for line_no, record, error in records:
+                stats["rows"] += 1
+                row = None
+                if error is None:
+                    row, error = validate(record, default_description)
+                if row is not None:
+                    description = row[0]
+                    if description not in owners:
+                        # new classes belong to the importing user, existing ones must already be theirs
+                        owners[description] = writer.call(claim_class, description, unionid) == unionid
+                    if not owners[description]:
+                        error = f"Class '{description}' belongs to another user."
+                if error is not None:
+                    stats["errors"] += 1
+                    if stats["errors"] <= MAX_ERROR_EVENTS:
+                        response.write_chunk(event(event="error", line=line_no, msg=error))
+                    continue
+
+                batch.setdefault(description, []).append(row[1])
+                pending += 1
+                if pending >= BATCH_ROWS:
+                    flush(batch, stats)
+                    batch = {}
+                    pending = 0
+                    response.write_chunk(event(event="progress", **stats), flush=True)
+        except csv.Error as e:
+            # the rest of the body cannot be parsed; rows read before it are still written
+            stats["errors"] += 1
+            response.write_chunk(event(event="error", line=stats["rows"] + 1, msg=f"Invalid CSV: {e}", fatal=True))
+        if pending:
+            flush(batch, stats)
+
+    response.write_chunk(event(event="done", code=0, **stats))
+    response.end_chunked()
@@ -1,3 +1,6 @@
+from itertools import groupby
+
+from peewee import JOIN, fn
 from server import vercel
 from server import decorators as dec
 from database import table
@@ -6,6 +9,28 @@ from user.login import get_unionid_from_code
 db = table.db
 Student = table.Student
 ClassCreator = table.ClassCreater
+ClassVersion = table.ClassVersion
+
+# output name -> column; `fields` picks a subset, the default is all of them
+STUDENT_FIELDS = {
+    "student_id": Student.id,
+    "student_name": Student.name,
+    "student_major": Student.major,
+    "credits": Student.credits,
+    "random_rolls": Student.rolled,
+    "description": Student.description,
+}
+
+
+def parse_fields(value):
+    """`fields` as a comma separated string or a list; None means every field."""
+    if value in (None, "", []):
+        return list(STUDENT_FIELDS)
+    names = value.split(",") if isinstance(value, str) else list(value)
+    names = [str(name).strip() for name in names if str(name).strip()]
+    for name in names:
+        assert name in STUDENT_FIELDS, f"Unknown field '{name}'."
+    return names
 
 
 @dec.hot_reload
@@ -14,8 +39,13 @@ def main(response, data, headers):
     """Return all classes (and their students) for the current authenticated user.
     Expects Authorization header with Weixin js_code. Returns JSON:
     { code:0, msg:'Success', data: [ { description:..., students: [...] }, ... ] }
+    Optional: fields=student_id,student_name limits the student keys;
+    summary_only=1 returns { description, student_count, total_credits } per class instead.
     """
     assert "Authorization" in headers, "Missing 'Authorization' header."
+    data = data if isinstance(data, dict) else {}
+    fields = parse_fields(data.get("fields"))
+    summary_only = str(data.get("summary_only", "")).strip().lower() in ("1", "true", "yes", "y", "t")
 
     token_code = headers["Authorization"]
     unionid = get_unionid_from_code(token_code)
@@ -28,27 +58,46 @@ def main(response, data, headers):
         })
         return
 
-    db.connect(reuse_if_open=True)
-    classes = ClassCreator.select().where(ClassCreator.creator == unionid)
-    result = []
-    for klass in classes:
-        students = []
-        for s in Student.select().where(Student.description == klass.description):
-            students.append({
-                "student_id": s.id,
-                "student_name": s.name,
-                "student_major": s.major,
-                "credits": s.credits,
-                "random_rolls": s.rolled,
-                "description": s.description
-            })
-        result.append({
-            "description": klass.description,
-            "students": students
-        })
-    db.close()
+    with table.connection():
+        # 该用户所有班级及其数据版本，任一班级变化（或增删班级）都会改变 ETag
+        classes = list(ClassCreator
+                       .select(ClassCreator.description, ClassVersion.version)
+                       .join(ClassVersion, JOIN.LEFT_OUTER,
+                             on=(ClassVersion.description == ClassCreator.description))
+                       .where(ClassCreator.creator == unionid)
+                       .order_by(ClassCreator.description)
+                       .tuples())
+        etag = table.make_etag("list_all", unionid, classes, fields, summary_only)
+        if response.not_modified(etag):
+            return
+
+        # one LEFT JOIN over all of the user's classes, grouped here; a class without students yields one NULL row
+        if summary_only:
+            query = (ClassCreator
+                     .select(ClassCreator.description, fn.COUNT(Student.id), fn.COALESCE(fn.SUM(Student.credits), 0))
+                     .join(Student, JOIN.LEFT_OUTER, on=(Student.description == ClassCreator.description))
+                     .where(ClassCreator.creator == unionid)
+                     .group_by(ClassCreator.description)
+                     .order_by(ClassCreator.description)
+                     .tuples())
+            result = [{"description": description, "student_count": count, "total_credits": credits}
+                      for description, count, credits in query]
+        else:
+            query = (ClassCreator
+                     .select(ClassCreator.description, Student.id, *(STUDENT_FIELDS[f] for f in fields))
+                     .join(Student, JOIN.LEFT_OUTER, on=(Student.description == ClassCreator.description))
+                     .where(ClassCreator.creator == unionid)
+                     .order_by(ClassCreator.description)
+                     .tuples())
+            result = []
+            for description, rows in groupby(query, key=lambda row: row[0]):
+                result.append({
+                    "description": description,
+                    "students": [dict(zip(fields, row[2:])) for row in rows if row[1] is not None]
+                })
 
     response.send_code(200)
+    response.send_etag(etag)
     response.send_json({
         "code": 0,
         "msg": "Success",
@@ -0,0 +1,62 @@
+"""Static file serving must stay inside static_root.
+
+Run from roll-backend:  python -m unittest tests.test_static
+"""
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http import server
+
+from server import verapi
+
+
+class StaticRootTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, 'st')
+        os.mkdir(self.root)
+        with open(os.path.join(self.root, 'index.html'), 'w') as f:
+            f.write('public')
+        # 与根目录同名前缀的兄弟目录
+        os.mkdir(self.root + '2')
+        with open(os.path.join(self.root + '2', 'x'), 'w') as f:
+            f.write('secret')
+
+        handler = type('StaticHandler', (verapi.handler,), {'static_root': self.root})
+        self.httpd = server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target = self.httpd.serve_forever, daemon = True).start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self.tmp)
+
+    def get(self, path):
+        conn = http.client.HTTPConnection(*self.httpd.server_address[:2], timeout = 5)
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+    def test_serves_files_inside_root(self):
+        self.assertEqual(self.get('/index.html'), (200, b'public'))
+
+    def test_sibling_with_common_prefix_is_forbidden(self):
+        status, body = self.get('/../st2/x')
+        self.assertEqual(status, 403)
+        self.assertNotIn(b'secret', body)
+
+    def test_symlink_out_of_root_is_forbidden(self):
+        os.symlink(self.root + '2', os.path.join(self.root, 'link'))
+        status, body = self.get('/link/x')
+        self.assertEqual(status, 403)
+        self.assertNotIn(b'secret', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
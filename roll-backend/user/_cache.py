@@ -0,0 +1,106 @@
+"""js_code -> jscode2session result cache shared by user/login.py and every handler that imports it.
+
+It lives in a module the router does not load as a handler, so the hot-reloaded copy of login.py
+and the `user.login` imported by other handlers use the same instance and counters.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from server import vercel
+
+# One cache per worker process. A js_code is valid for 5 minutes, so entries never need to live longer.
+CODE_CACHE_SIZE = int(os.environ.get("ROLL_CODE_CACHE_SIZE", 10000))
+CODE_CACHE_TTL = 300
+PRUNE_INTERVAL = 60     # seconds between background sweeps of expired entries
+LOAD_TIMEOUT = 10       # seconds a caller waits for an exchange started by another request
+
+
+class IdentityCache:
+    """Bounded LRU of js_code -> jscode2session result with TTL and single-flight loading.
+
+    Only successful exchanges are stored; the least recently used entry is evicted beyond
+    maxsize and a daemon thread drops expired ones every prune_interval seconds.
+    Counters are read with stats().
+    """
+    def __init__(self, maxsize, ttl, prune_interval):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._entries = OrderedDict()   # js_code -> (result, expire_ts)
+        self._inflight = {}             # js_code -> Future of the running exchange
+        self._lock = threading.Lock()
+        self._pruner = vercel.daemon(self._prune_forever)
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0}
+
+    def get_or_load(self, key, loader):
+        """Cached result for key, or loader(key) run once however many callers ask at the same time."""
+        with self._lock:
+            if self._pruner.thread is None or not self._pruner.thread.is_alive():
+                self._pruner()
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return entry[0]
+                del self._entries[key]
+                self._counters["expirations"] += 1
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                self._counters["misses"] += 1
+                future = self._inflight[key] = Future()
+            else:
+                self._counters["coalesced"] += 1
+        if not owner:
+            return future.result(LOAD_TIMEOUT)
+        try:
+            result = loader(key)
+            if not result.get("errcode") and (result.get("unionid") or result.get("openid")):
+                with self._lock:
+                    self._entries[key] = (result, time.time() + self.ttl)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                        self._counters["evictions"] += 1
+        except BaseException as e:
+            # waiters must never be left on a future that does not resolve, even on KeyboardInterrupt / SystemExit
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def prune(self):
+        """Remove expired entries, returns how many were dropped."""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, (_, expire_ts) in self._entries.items() if expire_ts <= now]
+            for k in expired:
+                del self._entries[k]
+            self._counters["expirations"] += len(expired)
+        return len(expired)
+
+    def _prune_forever(self):
+        while True:
+            time.sleep(self.prune_interval)
+            self.prune()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, size=len(self._entries), inflight=len(self._inflight),
+                        maxsize=self.maxsize, ttl=self.ttl)
+
+
+CODE_CACHE = IdentityCache(CODE_CACHE_SIZE, CODE_CACHE_TTL, PRUNE_INTERVAL)
+
+
+def stats():
+    """Hit / miss / eviction counters of the js_code cache."""
+    return CODE_CACHE.stats()
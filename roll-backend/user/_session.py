@@ -0,0 +1,91 @@
+"""Signed session tokens issued by /user/login.
+
+A token is  rs1.<payload>.<signature>  where payload is base64url JSON {"sub", "iat", "exp"}
+and signature is base64url HMAC-SHA256 over "rs1.<payload>". Handlers verify it in-process,
+so an authenticated request never waits on api.weixin.qq.com.
+"""
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+
+PREFIX = "rs1"
+SESSION_TTL = int(os.environ.get("ROLL_SESSION_TTL", 7 * 24 * 3600))   # seconds a token stays valid
+# 所有工作进程必须使用同一个密钥：优先取环境变量，否则读取（或首次创建）数据库旁的密钥文件
+SECRET_PATH = os.path.join(os.path.abspath(os.getcwd()), "session.key")
+
+_secret = None
+
+
+def _load_secret():
+    env = os.environ.get("ROLL_SESSION_SECRET")
+    if env:
+        return env.encode("utf-8")
+    try:
+        # O_EXCL: when several workers start at once exactly one of them writes the key
+        fd = os.open(SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(SECRET_PATH, "rb") as f:
+                secret = f.read()
+            if secret:
+                return secret
+            time.sleep(0.01)    # the creating worker has not written it yet
+        raise RuntimeError(f"Session key file '{SECRET_PATH}' is empty.")
+    secret = base64.urlsafe_b64encode(os.urandom(32))
+    with os.fdopen(fd, "wb") as f:
+        f.write(secret)
+    return secret
+
+
+def secret():
+    global _secret
+    if _secret is None:
+        _secret = _load_secret()
+    return _secret
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(message):
+    return _b64encode(hmac.new(secret(), message.encode("ascii"), hashlib.sha256).digest())
+
+
+def is_token(value):
+    """Whether value looks like a session token (as opposed to a Weixin js_code)."""
+    return isinstance(value, str) and value.startswith(PREFIX + ".")
+
+
+def issue(identity, ttl=SESSION_TTL):
+    """New token for identity, returns (token, expires_at as a unix timestamp)."""
+    now = int(time.time())
+    payload = _b64encode(json.dumps({"sub": identity, "iat": now, "exp": now + ttl},
+                                    separators=(",", ":")).encode("utf-8"))
+    message = f"{PREFIX}.{payload}"
+    return f"{message}.{_sign(message)}", now + ttl
+
+
+def verify(token):
+    """Identity of a valid, unexpired token, otherwise None. No I/O besides reading the key once."""
+    if not is_token(token):
+        return None
+    try:
+        prefix, payload, signature = token.split(".")
+        if not hmac.compare_digest(_sign(f"{prefix}.{payload}"), signature):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(claims, dict) or not isinstance(claims.get("sub"), str):
+        return None
+    if not isinstance(claims.get("exp"), int) or claims["exp"] <= time.time():
+        return None
+    return claims["sub"]
@@ -0,0 +1,53 @@
+"""Local stand-in for api.weixin.qq.com/sns/jscode2session, for tests and offline development.
+
+Any js_code is accepted once and maps to a fixed identity: openid "stub-openid-<code>",
+unionid "stub-unionid-<code>". Codes starting with "bad" are rejected (40029) and a reused
+code gets 40163 "code been used", as the real endpoint does. GET /stats reports how many
+exchanges were requested, so a test can check that token-authenticated calls made none.
+
+Run from roll-backend:  python -m user._weixin_stub [port]
+then start the server with  ROLL_WEIXIN_API=http://127.0.0.1:<port>
+"""
+import sys
+import threading
+
+from server import vercel
+
+_used = set()
+_lock = threading.Lock()
+_stats = {"requests": 0}
+
+
+class WeixinStub(vercel.API):
+    def vercel(self, url, data, headers):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        self.send_code(200)
+        if path == "/stats":
+            self.send_json(dict(_stats))
+            return
+        if path != "/sns/jscode2session":
+            self.send_json({"errcode": 40066, "errmsg": "invalid url"})
+            return
+        js_code = data.get("js_code") if isinstance(data, dict) else None
+        with _lock:
+            _stats["requests"] += 1
+            reused = js_code in _used
+            if js_code:
+                _used.add(js_code)
+        if not js_code:
+            self.send_json({"errcode": 41008, "errmsg": "missing code"})
+        elif js_code.startswith("bad"):
+            self.send_json({"errcode": 40029, "errmsg": "invalid code"})
+        elif reused:
+            self.send_json({"errcode": 40163, "errmsg": "code been used"})
+        else:
+            self.send_json({
+                "openid": f"stub-openid-{js_code}",
+                "unionid": f"stub-unionid-{js_code}",
+                "session_key": "stub-session-key",
+            })
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 18080
+    vercel.start(HandlerClass=WeixinStub, port=port, bind="127.0.0.1")
@@ -0,0 +1,27 @@
+from server import vercel
+from server import decorators as dec
+from user import _cache
+from user.login import get_unionid_from_code
+
+
+@dec.hot_reload
+@vercel.register
+def main(response, data, headers):
+    """Counters of this worker's js_code -> identity cache (hits, misses, coalesced, evictions, expirations)."""
+    assert "Authorization" in headers, "Missing Authorization header."
+
+    unionid = get_unionid_from_code(headers["Authorization"])
+    if not unionid:
+        response.send_code(200)
+        response.send_json({
+            "code": 401,
+            "msg": "Invalid or expired Weixin code, please re-login.",
+        })
+        return
+
+    response.send_code(200)
+    response.send_json({
+        "code": 0,
+        "msg": "Success",
+        "data": _cache.stats(),
+    })
@@ -24,13 +24,19 @@ export interface RollResultPayload {
   answer_condition: number
 }
 
+// 只读接口的 ETag 缓存：key 为 method + url + body，数据未变化时后端返回 304
+const etagCache = new Map<string, { etag: string; data: any }>()
+
 // 请求封装
 function request<T = any>(
   url: string,
   method: 'GET' | 'POST' | 'PUT' | 'DELETE' = 'GET',
   data?: any,
-  headers?: Record<string, string>
+  headers?: Record<string, string>,
+  cacheable: boolean = false
 ): Promise<T> {
+  const cacheKey = cacheable ? `${method} ${url} ${JSON.stringify(data ?? null)}` : ''
+  const cached = cacheable ? etagCache.get(cacheKey) : undefined
   return new Promise((resolve, reject) => {
     uni.request({
       url: `${BASE_URL}${url}`,
@@ -38,10 +44,16 @@ function request<T = any>(
       data,
       header: {
         'Content-Type': 'application/json',
+        ...(cached ? { 'If-None-Match': cached.etag } : {}),
         ...(headers || {})
       },
       success: (res) => {
-        if (res.statusCode >= 200 && res.statusCode < 300) {
+        if (res.statusCode === 304 && cached) {
+          resolve(cached.data as T)
+        } else if (res.statusCode >= 200 && res.statusCode < 300) {
+          const header = (res.header || {}) as Record<string, string>
+          const etag = header['ETag'] || header['Etag'] || header['etag']
+          if (cacheable && etag) etagCache.set(cacheKey, { etag, data: res.data })
           resolve(res.data as T)
         } else {
           reject(new Error(`请求失败: ${res.statusCode}`))
@@ -76,24 +88,49 @@ export async function getWeixinAuthCode(): Promise<string | undefined> {
   return code
 }
 
-import { saveWeixinAuthCode } from '@/utils/storage'
+import { saveWeixinAuthCode, getSessionToken, saveSessionToken, clearSessionToken } from '@/utils/storage'
 let weixinAuthTimer: any | null = null
 
-// 构建身份验证头（包含微信登录 code）
+// 用微信 code 向后端换取会话令牌；后端只在这里访问一次微信接口，之后在本地校验令牌
+export async function loginWithWeixin(): Promise<string | undefined> {
+  const code = await getWeixinAuthCode()
+  if (!code) return undefined
+  const res: any = await request('/user/login', 'POST', { code })
+  if (res && res.code === 0 && res.data && res.data.token) {
+    saveSessionToken(res.data.token, Number(res.data.expires_at) * 1000)
+    return res.data.token
+  }
+  clearSessionToken()
+  return undefined
+}
+
+// 构建身份验证头（包含会话令牌；令牌缺失或即将过期时重新登录）
 export async function buildIdentityHeaders(): Promise<Record<string, string>> {
   const headers: Record<string, string> = {}
-  // 为避免使用已经被微信标记为 "code been used" 的旧 code，
-  // 在每次发起带身份的请求前都主动去获取一个新的 code。
   try {
-    const newCode = await refreshWeixinAuthCode()
-    console.log('Refreshed weixin auth code for request:', newCode)
-    if (newCode) headers['Authorization'] = newCode
+    const token = getSessionToken() || (await loginWithWeixin())
+    if (token) headers['Authorization'] = token
   } catch (e) {
-    console.warn('refreshWeixinAuthCode failed', e)
+    console.warn('loginWithWeixin failed', e)
   }
   return headers
 }
 
+// 带身份的请求：后端返回 code 401（令牌伪造、过期或签名密钥已更换）时清除令牌、重新登录并重试一次
+async function authRequest<T = any>(
+  url: string,
+  method: 'GET' | 'POST' | 'PUT' | 'DELETE' = 'GET',
+  data?: any,
+  cacheable: boolean = false
+): Promise<T> {
+  const res: any = await request<T>(url, method, data, await buildIdentityHeaders(), cacheable)
+  if (res && res.code === 401) {
+    clearSessionToken()
+    return request<T>(url, method, data, await buildIdentityHeaders(), cacheable)
+  }
+  return res
+}
+
 // 刷新微信登录 code
 export async function refreshWeixinAuthCode(): Promise<string | undefined> {
   const code = await getWeixinAuthCode()
@@ -120,8 +157,7 @@ export function stopWeixinAuthCodeAutoRefresh(): void {
 
 // 导入学生名单
 export async function importStudents(data: StudentImportRequest): Promise<any> {
-  const headers = await buildIdentityHeaders()
-  return request('/students/import', 'POST', data, headers)
+  return authRequest('/students/import', 'POST', data)
 }
 
 // 提交点名结果
@@ -132,7 +168,7 @@ export async function submitRollResult(payload: RollResultPayload): Promise<any>
     .join('&')
 
   const url = query ? `/roll/result?${query}` : '/roll/result'
-  return buildIdentityHeaders().then((headers) => request(url, 'POST', undefined, headers))
+  return authRequest(url, 'POST')
 }
 
 // 获取积分排行榜（order: 0 升序，1 降序）
@@ -149,7 +185,7 @@ export async function getPointsRank(
     .map(([key, value]) => `${encodeURIComponent(key)}=${encodeURIComponent(value)}`)
     .join('&')
   const url = query ? `/points/rank?${query}` : '/points/rank'
-  return buildIdentityHeaders().then((headers) => request(url, 'GET', undefined, headers))
+  return authRequest(url, 'GET', undefined, true)
 }
 
 // 积分排行接口类型
@@ -163,30 +199,111 @@ export interface PointsRankItem {
 export async function deleteStudentListOne(description?: string): Promise<any> {
   const query = description ? `?description=${encodeURIComponent(description)}` : ''
   const url = `/students/delete/one${query}`
-  return buildIdentityHeaders().then((headers) => request(url, 'DELETE', undefined, headers))
+  return authRequest(url, 'DELETE')
 }
 
 export async function deleteStudentListAll(): Promise<any> {
   const url = `/students/delete/all`
-  return buildIdentityHeaders().then((headers) => request(url, 'DELETE', undefined, headers))
+  return authRequest(url, 'DELETE')
 }
 
 // 导出学生名单，后端期望 POST { description }
 export async function exportStudents(description: string): Promise<any> {
-  const headers = await buildIdentityHeaders()
   const body = { description }
-  return request('/students/export', 'POST', body, headers)
+  return authRequest('/students/export', 'POST', body, true)
+}
+
+// 下载一次导出文件：成功时返回本地文件路径；后端以 JSON 回复错误（例如 code 401）时返回该 JSON
+function downloadExportOnce(url: string, headers: Record<string, string>): Promise<{ code: number; msg?: string; filePath?: string }> {
+  // #ifdef H5
+  return fetch(url, { headers }).then(async (res) => {
+    if (!res.ok) return { code: res.status, msg: `下载失败: ${res.status}` }
+    if ((res.headers.get('Content-Type') || '').includes('application/json')) return res.json()
+    return { code: 0, filePath: URL.createObjectURL(await res.blob()) }
+  })
+  // #endif
+  // #ifndef H5
+  return new Promise((resolve, reject) => {
+    let contentType = ''
+    const task: any = uni.downloadFile({
+      url,
+      header: headers,
+      success: (res) => {
+        if (res.statusCode !== 200) {
+          resolve({ code: res.statusCode, msg: `下载失败: ${res.statusCode}` })
+        } else if (contentType.includes('application/json')) {
+          uni.getFileSystemManager().readFile({
+            filePath: res.tempFilePath,
+            encoding: 'utf8',
+            success: (file) => {
+              try {
+                resolve(JSON.parse(file.data as string))
+              } catch (e) {
+                reject(e)
+              }
+            },
+            fail: (err) => reject(err)
+          })
+        } else {
+          resolve({ code: 0, filePath: res.tempFilePath })
+        }
+      },
+      fail: (err) => {
+        reject(err)
+      }
+    })
+    task.onHeadersReceived((res: any) => {
+      const header = (res && res.header) || {}
+      contentType = String(header['Content-Type'] || header['content-type'] || '')
+    })
+  })
+  // #endif
+}
+
+// 下载后端流式生成的名单文件（xlsx 含学生与积分记录两个工作表），返回本地临时文件路径
+// 与 authRequest 相同：后端返回 code 401 时清除令牌、重新登录并重试一次，不会把错误 JSON 当作文件保存
+export async function downloadStudentsFile(description: string, format: 'csv' | 'xlsx' = 'xlsx'): Promise<string> {
+  const url = `${BASE_URL}/students/export?description=${encodeURIComponent(description)}&format=${format}`
+  let res = await downloadExportOnce(url, await buildIdentityHeaders())
+  if (res.code === 401) {
+    clearSessionToken()
+    res = await downloadExportOnce(url, await buildIdentityHeaders())
+  }
+  if (res.code !== 0 || !res.filePath) {
+    throw new Error(res.msg || '下载失败')
+  }
+  return res.filePath
 }
 
 // 从后端获取一个随机学生（由后端负责权限校验与随机选择）
 export async function pickRandomStudent(description: string, mode: 'random' | 'order' = 'random'): Promise<{ code: number; msg: string; data: { student_id: string; student_name: string } }> {
-  const headers = await buildIdentityHeaders()
   const body = { description, mode }
-  return request('/roll/random', 'POST', body, headers)
+  return authRequest('/roll/random', 'POST', body)
+}
+
+// 一次抽取 k 个不重复的学生（分组练习），按同样的积分权重不放回抽样
+export async function pickRandomStudents(description: string, k: number, mode: 'random' | 'order' = 'random'): Promise<{ code: number; msg: string; data: { student_id: string; student_name: string }[] }> {
+  const body = { description, mode, k }
+  return authRequest('/roll/random', 'POST', body)
 }
 
 // 获取当前用户在后端的所有名单及学生
-export async function getMyStudentLists(): Promise<{ description: string; students: any[] }[]> {
-  const headers = await buildIdentityHeaders()
-  return request('/students/list_all', 'POST', {}, headers)
+// fields 只取需要的学生字段；summary_only 时只返回每个名单的人数与总积分
+export async function getMyStudentLists(
+  options: { fields?: string[]; summary_only?: boolean } = {}
+): Promise<{ description: string; students: any[] }[]> {
+  return authRequest('/students/list_all', 'POST', options, true)
+}
+
+// 积分历史：按天与按学生的出勤率、平均答题评分与累计加分；start / end 为 YYYY-MM-DD（含首尾）
+export async function getScoreHistory(
+  description: string,
+  options: { start?: string; end?: string; student_id?: string } = {}
+): Promise<any> {
+  const params: Record<string, any> = { description, ...options }
+  const query = Object.entries(params)
+    .filter(([, value]) => value !== undefined && value !== '')
+    .map(([key, value]) => `${encodeURIComponent(key)}=${encodeURIComponent(value)}`)
+    .join('&')
+  return authRequest(`/points/history?${query}`, 'GET', undefined, true)
 }
@@ -14,6 +14,8 @@ const SETTINGS_KEY = 'app_settings'
 const SELECTED_LIST_KEY = 'selected_list_index'
 const WEIXIN_AUTH_CODE_KEY = 'weixin_auth_code'
 const WEIXIN_AUTH_CODE_TS_KEY = 'weixin_auth_code_ts'
+const SESSION_TOKEN_KEY = 'session_token'
+const SESSION_TOKEN_EXP_KEY = 'session_token_expires_at'
 
 /**
  * 获取所有学生名单
@@ -192,3 +194,36 @@ export const clearWeixinAuthCode = (): void => {
     console.error('Failed to clear weixin auth code:', error)
   }
 }
+
+/**
+ * 会话令牌（/user/login 签发），提前 marginMs 视为过期以免请求途中失效
+ */
+export const saveSessionToken = (token: string, expiresAt: number): void => {
+  try {
+    uni.setStorageSync(SESSION_TOKEN_KEY, token)
+    uni.setStorageSync(SESSION_TOKEN_EXP_KEY, expiresAt)
+  } catch (error) {
+    console.error('Failed to save session token:', error)
+  }
+}
+
+export const getSessionToken = (marginMs: number = 60000): string | null => {
+  try {
+    const token = uni.getStorageSync(SESSION_TOKEN_KEY)
+    const expiresAt = Number(uni.getStorageSync(SESSION_TOKEN_EXP_KEY))
+    if (!token || Number.isNaN(expiresAt) || Date.now() + marginMs >= expiresAt) return null
+    return typeof token === 'string' ? token : null
+  } catch (error) {
+    console.error('Failed to get session token:', error)
+    return null
+  }
+}
+
+export const clearSessionToken = (): void => {
+  try {
+    uni.removeStorageSync(SESSION_TOKEN_KEY)
+    uni.removeStorageSync(SESSION_TOKEN_EXP_KEY)
+  } catch (error) {
+    console.error('Failed to clear session token:', error)
+  }
+}